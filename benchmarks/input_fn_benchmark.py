@@ -0,0 +1,88 @@
+"""Benchmarks building the categorical SparseTensor indices in `input_fn`.
+
+Run from the repository root:
+
+  python benchmarks/input_fn_benchmark.py
+
+For 10k to 10M rows this times the original labs' `[[i, 0] for i in
+range(n)]` list against `input_fns.sparse_indices`, the NumPy expression
+that the labs with categorical features inline.  It also times building
+the whole `input_fn` graph for the eight census `CATEGORICAL_COLUMNS` both
+ways, which includes TensorFlow's conversion of the indices into a
+constant.  The list version is skipped above
+`MAX_LIST_ROWS` rows because the lists alone need several GB there.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+import tensorflow as tf  # pylint: disable=g-import-not-at-top
+
+import input_fns  # pylint: disable=g-import-not-at-top
+
+ROW_COUNTS = [10000, 100000, 1000000, 10000000]
+MAX_LIST_ROWS = 1000000
+CATEGORICAL_COLUMNS = ["workclass", "education", "marital_status", "occupation",
+                       "relationship", "race", "gender", "native_country"]
+
+
+def list_indices(num_rows):
+  return [[i, 0] for i in range(num_rows)]
+
+
+def best_time(function, repeat=3):
+  return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def graph_build_time(dataframe, vectorized):
+  """Times building the categorical part of the labs' input_fn graph."""
+  def build():
+    with tf.Graph().as_default():
+      if vectorized:
+        input_fns.input_fn(dataframe, [], CATEGORICAL_COLUMNS)
+      else:
+        for k in CATEGORICAL_COLUMNS:
+          tf.SparseTensor(indices=list_indices(dataframe[k].size),
+                          values=dataframe[k].values,
+                          dense_shape=[dataframe[k].size, 1])
+  return best_time(build, repeat=1)
+
+
+def main():
+  print("%10s %14s %14s %10s" % ("rows", "list (s)", "numpy (s)", "speedup"))
+  for num_rows in ROW_COUNTS:
+    after = best_time(lambda: input_fns.sparse_indices(num_rows))
+    if num_rows <= MAX_LIST_ROWS:
+      before = best_time(lambda: list_indices(num_rows))
+      print("%10d %14.5f %14.5f %9.0fx" % (num_rows, before, after,
+                                           before / after))
+    else:
+      print("%10d %14s %14.5f %10s" % (num_rows, "skipped", after, ""))
+
+  print()
+  print("input_fn graph with %d categorical columns" % len(CATEGORICAL_COLUMNS))
+  print("%10s %14s %14s %10s" % ("rows", "list (s)", "numpy (s)", "speedup"))
+  for num_rows in ROW_COUNTS:
+    dataframe = pd.DataFrame(dict(
+        (k, np.full(num_rows, "value", dtype=object))
+        for k in CATEGORICAL_COLUMNS))
+    after = graph_build_time(dataframe, vectorized=True)
+    if num_rows <= MAX_LIST_ROWS:
+      before = graph_build_time(dataframe, vectorized=False)
+      print("%10d %14.3f %14.3f %9.0fx" % (num_rows, before, after,
+                                           before / after))
+    else:
+      print("%10d %14s %14.3f %10s" % (num_rows, "skipped", after, ""))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,56 @@
+"""Benchmarks the TFRecord input pipeline of lab 12.
+
+Run from the repository root, after downloading the lab 12 data:
+
+  python benchmarks/tfrecord_input_benchmark.py /tmp/train.tfrecord
+
+or with sharded files:
+
+  python benchmarks/tfrecord_input_benchmark.py "/tmp/train-*.tfrecord"
+
+For reader and parser thread counts up to the number of cores this prints
+the examples per second `tfrecords.read_batch_features` delivers with lab
+12's parse spec, so `_input_fn`'s options can be sized to the machine.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import multiprocessing
+import os
+import sys
+
+import tensorflow as tf
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+import tfrecords  # pylint: disable=g-import-not-at-top
+
+FEATURES_TO_TYPES_DICT = {
+    "terms": tf.VarLenFeature(dtype=tf.string),
+    "labels": tf.FixedLenFeature(shape=[1], dtype=tf.float32)}
+
+
+def thread_counts(num_cores):
+  counts = [1]
+  while counts[-1] * 2 <= num_cores:
+    counts.append(counts[-1] * 2)
+  return counts
+
+
+def main(argv):
+  file_pattern = argv[1] if len(argv) > 1 else "/tmp/train.tfrecord"
+  counts = thread_counts(multiprocessing.cpu_count())
+  print("%-8s %-8s %14s" % ("readers", "parsers", "examples/sec"))
+  for reader_num_threads in counts:
+    for parser_num_threads in counts:
+      input_fn = lambda: tfrecords.read_batch_features(  # pylint: disable=cell-var-from-loop
+          file_pattern, FEATURES_TO_TYPES_DICT,
+          reader_num_threads=reader_num_threads,
+          parser_num_threads=parser_num_threads)
+      print("%-8d %-8d %14.0f" % (reader_num_threads, parser_num_threads,
+                                  tfrecords.measure_throughput(input_fn)))
+
+
+if __name__ == "__main__":
+  main(sys.argv)
@@ -0,0 +1,193 @@
+"""Out-of-core feature preparation for CSV files larger than memory.
+
+The labs load a whole data set into one DataFrame, call `prepare_features` on
+it and split it with `head`/`tail`:
+
+  training_examples = prepare_features(census_df.head(12281))
+  validation_examples = prepare_features(census_df.tail(4000))
+
+`prepare_features_in_chunks` does the same work while only ever holding
+`chunksize` rows in memory.  The CSV is read in fixed-size chunks, every row
+is randomly assigned to the training or validation set, `prepare_features` is
+run on each chunk and the result is written as one columnar shard (see
+`columnar`) per chunk and split:
+
+  statistics = chunked.scan_statistics(CENSUS_CSV, NUMERICAL_COLUMNS,
+                                       names=COLUMNS, skipinitialspace=True)
+  shards = chunked.prepare_features_in_chunks(
+      CENSUS_CSV,
+      functools.partial(chunked.prepare_census_features,
+                        statistics=statistics),
+      "/tmp/census_shards", validation_fraction=4000.0 / 16281,
+      names=COLUMNS, skipinitialspace=True)
+
+Scaling needs statistics of the whole column, not of one chunk, otherwise
+every chunk would be scaled differently.  `scan_statistics` computes them in
+a first streaming pass so that `prepare_features` can scale each chunk with
+the global minimum and maximum.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import columnar
+import dataset_cache
+
+DEFAULT_CHUNKSIZE = 100000
+TRAINING = "training"
+VALIDATION = "validation"
+
+
+def iter_chunks(source, chunksize=DEFAULT_CHUNKSIZE, **read_csv_kwargs):
+  """Reads a CSV file as a sequence of DataFrames of at most `chunksize` rows.
+
+  Args:
+    source: A URL or local path.  URLs are downloaded through
+      `dataset_cache`, so a large file is only fetched once.
+    chunksize: The number of rows per chunk.
+    **read_csv_kwargs: Arguments passed on to `pd.read_csv`.
+  Returns:
+    An iterator over DataFrames.
+  """
+  path = dataset_cache.local_path(source)
+  return pd.read_csv(path, chunksize=chunksize, **read_csv_kwargs)
+
+
+def scan_statistics(source, columns, chunksize=DEFAULT_CHUNKSIZE,
+                    **read_csv_kwargs):
+  """Computes per-column statistics of a CSV file in one streaming pass.
+
+  Args:
+    source: A URL or local path of the CSV file.
+    columns: The numerical columns to compute statistics for.
+    chunksize: The number of rows read at a time.
+    **read_csv_kwargs: Arguments passed on to `pd.read_csv`.
+  Returns:
+    A dictionary mapping each column to a dictionary with its `count`,
+    `min`, `max` and `mean`, ignoring missing values.
+  """
+  count = dict((c, 0) for c in columns)
+  total = dict((c, 0.0) for c in columns)
+  minimum = dict((c, np.inf) for c in columns)
+  maximum = dict((c, -np.inf) for c in columns)
+  for chunk in iter_chunks(source, chunksize, **read_csv_kwargs):
+    for c in columns:
+      values = chunk[c].dropna().values
+      if len(values) == 0:
+        continue
+      count[c] += len(values)
+      total[c] += float(values.sum())
+      minimum[c] = min(minimum[c], float(values.min()))
+      maximum[c] = max(maximum[c], float(values.max()))
+  return dict((c, {"count": count[c],
+                   "min": minimum[c],
+                   "max": maximum[c],
+                   "mean": total[c] / count[c] if count[c] else np.nan})
+              for c in columns)
+
+
+def linear_scale(series, statistics):
+  """Linearly rescales a column to [0, 1] using precomputed statistics."""
+  scale = 1.0 * (statistics["max"] - statistics["min"])
+  return (series - statistics["min"]) / scale
+
+
+def prepare_census_features(dataframe, statistics,
+                            numerical_columns=("age", "education_num",
+                                               "capital_gain", "capital_loss",
+                                               "hours_per_week"),
+                            label="income_over_50k"):
+  """The census `prepare_features` from labs 8-11 for a single chunk.
+
+  Args:
+    dataframe: A chunk of the census data set.
+    statistics: The result of `scan_statistics` over the whole data set.
+    numerical_columns: The columns to linearly scale.
+    label: The name of the label column to add.
+  Returns:
+    A new DataFrame that contains the features to be used for the model.
+  """
+  processed_features = dataframe.copy()
+  for feature in numerical_columns:
+    processed_features[feature] = linear_scale(dataframe[feature],
+                                               statistics[feature])
+
+  # Convert the output target to 0 (for <=50k) and 1 (> 50k)
+  processed_features[label] = dataframe["income_bracket"].str.contains(
+      ">50K", regex=False).astype(int)
+
+  return processed_features
+
+
+def prepare_features_in_chunks(source, prepare_features, output_dir,
+                               validation_fraction=0.0,
+                               chunksize=DEFAULT_CHUNKSIZE, seed=0,
+                               **read_csv_kwargs):
+  """Runs `prepare_features` over a CSV file chunk by chunk.
+
+  Peak memory is bounded by `chunksize` no matter how large the file is.
+
+  Args:
+    source: A URL or local path of the CSV file.
+    prepare_features: A function taking a DataFrame chunk and returning the
+      prepared DataFrame.
+    output_dir: The directory to write the shards to.  Training shards are
+      written to `<output_dir>/training` and validation shards to
+      `<output_dir>/validation`; both are deleted first, so the shards of an
+      earlier run are replaced rather than mixed with the new ones.
+    validation_fraction: The probability with which each row is put in the
+      validation set instead of the training set.
+    chunksize: The number of rows read and prepared at a time.
+    seed: The seed for the training/validation assignment, so that repeated
+      runs produce the same split.
+    **read_csv_kwargs: Arguments passed on to `pd.read_csv`.
+  Returns:
+    A dictionary mapping `TRAINING` and `VALIDATION` to the list of shard
+    directories written for each.
+  """
+  for split in (TRAINING, VALIDATION):
+    split_dir = os.path.join(output_dir, split)
+    if os.path.isdir(split_dir):
+      shutil.rmtree(split_dir)
+  random_state = np.random.RandomState(seed)
+  shards = {TRAINING: [], VALIDATION: []}
+  for index, chunk in enumerate(
+      iter_chunks(source, chunksize, **read_csv_kwargs)):
+    is_validation = random_state.random_sample(len(chunk)) < validation_fraction
+    for split, rows in ((TRAINING, ~is_validation),
+                        (VALIDATION, is_validation)):
+      if not rows.any():
+        continue
+      shard_dir = os.path.join(output_dir, split, "shard-%05d" % index)
+      columnar.write_table(prepare_features(chunk[rows]), shard_dir)
+      shards[split].append(shard_dir)
+  return shards
+
+
+def list_shards(output_dir, split):
+  """Returns the shard directories written for `split`, in order."""
+  split_dir = os.path.join(output_dir, split)
+  if not os.path.isdir(split_dir):
+    return []
+  return [os.path.join(split_dir, name)
+          for name in sorted(os.listdir(split_dir))
+          if columnar.is_table(os.path.join(split_dir, name))]
+
+
+def iter_shards(output_dir, split, decode_categorical=True):
+  """Iterates over the prepared shards of a split one DataFrame at a time.
+
+  Args:
+    output_dir: The `output_dir` given to `prepare_features_in_chunks`.
+    split: `TRAINING` or `VALIDATION`.
+    decode_categorical: Passed on to `columnar.read_table`.
+  Returns:
+    An iterator over DataFrames, one per shard.
+  """
+  for shard_dir in list_shards(output_dir, split):
+    yield columnar.read_table(shard_dir, decode_categorical)
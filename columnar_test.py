@@ -0,0 +1,82 @@
+"""Round-trip tests for the columnar table format."""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import columnar
+
+
+class ColumnarTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory, ignore_errors=True)
+
+  def roundTrip(self, dataframe, **kwargs):
+    path = columnar.write_table(dataframe,
+                                os.path.join(self.directory, "table"))
+    self.assertTrue(columnar.is_table(path))
+    return columnar.read_table(path, **kwargs)
+
+  def testRoundTrip(self):
+    dataframe = pd.DataFrame({
+        "age": [39.0, 50.5, np.nan, 28.0],
+        "hours": [40, 13, 40, 60],
+        "big": [2 ** 40, 1, 2, 3],
+        "flag": [True, False, True, True],
+        "workclass": ["State-gov", None, "Private", u"Self-emp-\xe9"],
+    }, columns=["age", "hours", "big", "flag", "workclass"])
+    table = self.roundTrip(dataframe, decode_categorical=True)
+    self.assertEqual(list(table.columns), list(dataframe.columns))
+    self.assertEqual(table["age"].dtype, np.float32)
+    self.assertEqual(table["hours"].dtype, np.int32)
+    self.assertEqual(table["big"].dtype, np.int64)
+    np.testing.assert_array_equal(table["age"].values,
+                                  dataframe["age"].values.astype(np.float32))
+    for name in ("hours", "big", "flag"):
+      np.testing.assert_array_equal(table[name].values,
+                                    dataframe[name].values)
+    self.assertEqual(list(table["workclass"].fillna("?")),
+                     ["State-gov", "?", "Private", u"Self-emp-\xe9"])
+
+  def testCategoricalColumns(self):
+    dataframe = pd.DataFrame({"gender": ["Male", "Female", None, "Male"]})
+    table = self.roundTrip(dataframe)
+    self.assertEqual(table["gender"].dtype.name, "category")
+    self.assertEqual(list(table["gender"].cat.categories), ["Female", "Male"])
+    np.testing.assert_array_equal(table["gender"].cat.codes.values,
+                                  [1, 0, -1, 1])
+
+  def testColumnsAreCopyOnWriteMaps(self):
+    dataframe = pd.DataFrame({"age": np.arange(10, dtype=np.float64)})
+    table = self.roundTrip(dataframe)
+    self.assertIsInstance(table["age"].values, np.memmap)
+    table.loc[:, "age"] = -1.0
+    np.testing.assert_array_equal(table["age"].values, -np.ones(10))
+    reread = columnar.read_table(os.path.join(self.directory, "table"))
+    np.testing.assert_array_equal(reread["age"].values, np.arange(10))
+
+  def testEmptyTable(self):
+    dataframe = pd.DataFrame({"age": np.zeros(0), "workclass": []})
+    table = self.roundTrip(dataframe)
+    self.assertEqual(len(table), 0)
+    self.assertEqual(list(table.columns), ["age", "workclass"])
+
+  def testRefusesToOverwrite(self):
+    dataframe = pd.DataFrame({"age": [1.0]})
+    self.roundTrip(dataframe)
+    with self.assertRaises(OSError):
+      columnar.write_table(dataframe, os.path.join(self.directory, "table"))
+
+
+if __name__ == "__main__":
+  unittest.main()
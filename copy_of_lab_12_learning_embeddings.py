@@ -104,12 +104,39 @@ features_to_types_dict = {
 
 # Create an input_fn that parses the tf.Examples from the given file pattern,
 # and split them into features and targets.  We set a batch size of 250.
-def _input_fn(input_file_pattern):
+# The file pattern may match several shards (e.g. "/tmp/train-*.tfrecord"),
+# which the reader threads then read in parallel.  Raise reader_num_threads
+# and parser_num_threads up to the number of cores if reading is the
+# bottleneck; benchmarks/tfrecord_input_benchmark.py reports the examples
+# per second of each setting.
+#
+# With shuffle=True the files are read in a random order and the records
+# are shuffled in a buffer of queue_capacity records, so the files never
+# need to be shuffled on disk.  num_epochs=None repeats the data forever.
+# read_batch_features has no seed argument, so a seed is set as the graph
+# seed, which replaces the estimator's config.tf_random_seed and so also
+# seeds the model's initialization.  The seed only biases the order: the
+# parser threads race to enqueue batches and what the shuffle queue yields
+# depends on how full it is, so the order still varies from run to run.
+# Use shuffle=False with parser_num_threads=1 for a fixed order.
+def _input_fn(input_file_pattern, batch_size=250, shuffle=True,
+              num_epochs=None, seed=None, reader_num_threads=1,
+              parser_num_threads=2, read_batch_size=None,
+              queue_capacity=10000, feature_queue_capacity=100):
+  if seed is not None:
+    tf.set_random_seed(seed)
   features = tf.contrib.learn.io.read_batch_features(
     file_pattern=input_file_pattern,
-    batch_size=250,
+    batch_size=batch_size,
     features=features_to_types_dict,
-    reader=tf.TFRecordReader)
+    reader=tf.TFRecordReader,
+    randomize_input=shuffle,
+    num_epochs=num_epochs,
+    queue_capacity=queue_capacity,
+    feature_queue_capacity=feature_queue_capacity,
+    reader_num_threads=reader_num_threads,
+    num_enqueue_threads=parser_num_threads,
+    read_batch_size=read_batch_size)
   targets = features.pop("labels")
   return features, targets
 
@@ -162,12 +189,18 @@ def plot_learning_curve(training_losses, validation_losses):
   plt.plot(validation_losses, label="validation")
   plt.legend(loc=1)
   
-def train_model(model, steps):
+def train_model(model, steps, seed=None):
   """Trains a linear classifier.
   
   Args:
     model: The model to train.
     steps: A non-zero `int`, the total number of training steps.
+    seed: The seed for shuffling the training data, or None for a different
+      order on every run.  Each period uses seed + period, since every call
+      to fit starts a new reader.  The seed is set as the graph-level seed,
+      so it also replaces the model's `config.tf_random_seed` for the
+      initialization of its weights.  It only biases the shuffled order,
+      which still varies between runs with several parser threads.
     
   Returns:
     The trained model.
@@ -184,22 +217,34 @@ def train_model(model, steps):
   training_losses = []
   validation_losses = []
 
+  # The evaluation input functions are defined once and reused for every
+  # period.  Each evaluation builds a new reader, which reads the records in
+  # file order with a single parser thread: every period then evaluates the
+  # same batch and the losses are comparable from one period to the next.
+  training_evaluation_input_fn = lambda: _input_fn(
+      "/tmp/train.tfrecord", shuffle=False, parser_num_threads=1)
+  validation_input_fn = lambda: _input_fn(
+      "/tmp/test.tfrecord", shuffle=False, parser_num_threads=1)
+
   for period in range (0, periods):
-    # Call fit to train the model for steps_per_period steps.
-    model.fit(input_fn=lambda: _input_fn("/tmp/train.tfrecord"),
-              steps=steps_per_period)
+    # Call fit to train the model for steps_per_period steps.  Every fit
+    # starts a new reader, so a fixed seed would replay the same records in
+    # every period; each period gets its own seed instead.
+    period_seed = None if seed is None else seed + period
+    model.fit(
+        input_fn=lambda: _input_fn("/tmp/train.tfrecord", seed=period_seed),
+        steps=steps_per_period)
     
     # Compute the loss between the predictions and the correct labels, append
     # the training and validation loss to the list of losses used to generate
     # the learning curve after training is complete and print the current
     # training loss.
     training_evaluation_metrics = model.evaluate(
-        input_fn=lambda: _input_fn("/tmp/train.tfrecord"),
-        steps=1)
+        input_fn=training_evaluation_input_fn, steps=1)
     training_loss = training_evaluation_metrics['loss']
     
     validation_evaluation_metrics = model.evaluate(
-        input_fn=lambda: _input_fn("/tmp/test.tfrecord"), steps=1)
+        input_fn=validation_input_fn, steps=1)
     validation_loss = validation_evaluation_metrics['loss']
     training_losses.append(training_loss) 
     validation_losses.append(validation_loss) 
@@ -394,13 +394,15 @@ You are to complete the implementation of `linear_scale`, in which you simply st
 
 # Perform log scaling
 def log_scale(series):
-  return series.apply(lambda x:math.log(x+1.0))
+  return np.log1p(series)
 
 # Linearly rescales to the range [0, 1]
 # You need to write this function.  Right now it just returns the same series.
 def linear_scale(series):
   # add any additional lines of code needed
-  return series.apply(lambda x: float(x-series.min())/(series.max()-series.min()))
+  min_val = series.min()
+  max_val = series.max()
+  return (series - min_val) / (1.0 * (max_val - min_val))
 
 """**Test your scaling procedure** with the following code block that applies these two scaling methods to `price` and `highway-mpg` and then draws a histogram for each."""
 
@@ -361,7 +361,9 @@ def prepare_features(dataframe):
   return processed_features
 
 def linear_scale(series):
-  return series.apply(lambda x: float(x-series.min())/(series.max()-series.min()))
+  min_val = series.min()
+  max_val = series.max()
+  return (series - min_val) / (1.0 * (max_val - min_val))
 # Generate the training examples with your revised version of prepare_features
 training_examples = prepare_features(car_data)
 
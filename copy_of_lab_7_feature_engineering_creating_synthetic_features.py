@@ -381,18 +381,18 @@ def linear_scale(series):
   min_val = series.min()
   max_val = series.max()
   scale = 1.0 * (max_val - min_val)
-  return series.apply(lambda x:((x - min_val) / scale))
+  return (series - min_val) / scale
 
 # Perform log scaling
 def log_scale(series):
-  return series.apply(lambda x:math.log(x+1.0))
+  return np.log1p(series)
 
 
 # Clip all features to given min and max
 def clip(series, clip_to_min, clip_to_max):
   # You need to modify this to actually do the clipping versus just returning
   # the series unchanged.
-  return series.apply(lambda x: np.clip(x, clip_to_min, clip_to_max))
+  return series.clip(clip_to_min, clip_to_max)
 
 """[link text](https://)You can use this function to draw a histogram to help decide what kind of scaling is best to use for `households` and also to confirm your implementation of `clip` works as you intended."""
 
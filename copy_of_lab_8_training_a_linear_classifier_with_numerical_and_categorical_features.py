@@ -94,10 +94,15 @@ def input_fn(dataframe):
   # the values of that column stored in a constant Tensor.
   numerical_cols = {k: tf.constant(dataframe[k].values) 
                     for k in NUMERICAL_COLUMNS}
+  # Each categorical feature has exactly one value per row, stored at
+  # position [row, 0].  The indices are built once with NumPy and shared
+  # by all categorical features.
+  indices = np.column_stack([np.arange(len(dataframe), dtype=np.int64),
+                             np.zeros(len(dataframe), dtype=np.int64)])
   # Creates a dictionary mapping each categorical feature column name (k)
   # to the values of that column stored in a tf.SparseTensor.
   categorical_cols = {k: tf.SparseTensor(
-      indices=[[i, 0] for i in range(dataframe[k].size)],
+      indices=indices,
       values=dataframe[k].values,
       dense_shape=[dataframe[k].size, 1])
                       for k in CATEGORICAL_COLUMNS}
@@ -129,7 +134,7 @@ def linear_scale(series):
   min_val = series.min()
   max_val = series.max()
   scale = 1.0 * (max_val - min_val)
-  return series.apply(lambda x:((x - min_val) / scale))
+  return (series - min_val) / scale
 
 def prepare_features(dataframe):
   """Prepares the features for provided dataset.
@@ -0,0 +1,219 @@
+"""Local on-disk cache for the data sets the labs download.
+
+The labs load their data straight from the network on every run, e.g.
+
+  car_data = pd.read_csv('https://storage.googleapis.com/.../cars_data.csv',
+                         sep=',', names=cols, header=None, encoding='latin-1')
+
+`read_csv` is a drop-in replacement for that call:
+
+  car_data = dataset_cache.read_csv(
+      'https://storage.googleapis.com/.../cars_data.csv',
+      sep=',', names=cols, header=None, encoding='latin-1')
+
+The first call downloads the source once and converts the parsed table into
+the binary columnar format from `columnar`.  Later calls with the same source
+and the same parse arguments memory-map that table instead of downloading or
+parsing anything.  Sources are keyed by URL and the parsed tables by the
+SHA-256 of the downloaded content.  A URL is pinned to its first download:
+pass `refresh=True` to download it again when the upstream file may have
+changed, and a new content hash then parses a new table instead of reusing
+the stale one.
+
+Local file paths are accepted as sources too, and setting `offline=True` (or
+the `ML_DATASET_OFFLINE` environment variable) guarantees the network is never
+touched: a source that is not cached yet raises an `IOError` instead.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+import columnar
+
+try:
+  from urllib.request import urlretrieve
+except ImportError:
+  from urllib import urlretrieve
+
+DEFAULT_CACHE_DIR = os.path.join("~", ".cache", "ml_labs_datasets")
+_SOURCE_INFO_FILE = "source.json"
+
+
+def cache_dir(directory=None):
+  """Returns the cache directory to use.
+
+  Args:
+    directory: An explicit directory, or None to use `ML_DATASET_CACHE` from
+      the environment (falling back to `DEFAULT_CACHE_DIR`).
+  Returns:
+    The absolute path of the cache directory.
+  """
+  if directory is None:
+    directory = os.environ.get("ML_DATASET_CACHE", DEFAULT_CACHE_DIR)
+  return os.path.abspath(os.path.expanduser(directory))
+
+
+def _offline(offline):
+  if offline is None:
+    return os.environ.get("ML_DATASET_OFFLINE", "") not in ("", "0")
+  return offline
+
+
+def _is_url(source):
+  return "://" in source
+
+
+def _sha256(data):
+  if not isinstance(data, bytes):
+    data = data.encode("utf-8")
+  return hashlib.sha256(data).hexdigest()
+
+
+def file_sha256(path, block_size=1 << 20):
+  """Returns the hex SHA-256 of a file's content, read in blocks."""
+  digest = hashlib.sha256()
+  with open(path, "rb") as f:
+    block = f.read(block_size)
+    while block:
+      digest.update(block)
+      block = f.read(block_size)
+  return digest.hexdigest()
+
+
+def _local_sha256(path, directory=None):
+  """Returns the SHA-256 of a local file, hashing it only when it changed.
+
+  The hash is remembered in the cache under a key made of the file's
+  absolute path, size and modification time, so repeated loads of a large
+  local file do not read it in full before the parsed table is found.
+  """
+  path = os.path.abspath(path)
+  stat = os.stat(path)
+  key = _sha256("%s:%d:%r" % (path, stat.st_size, stat.st_mtime))
+  local_dir = os.path.join(cache_dir(directory), "local")
+  info_path = os.path.join(local_dir, key[:32] + ".json")
+  if os.path.isfile(info_path) and not refresh:
+    with open(info_path) as f:
+      return json.load(f)["sha256"]
+  content_sha256 = file_sha256(path)
+  if not os.path.isdir(local_dir):
+    os.makedirs(local_dir)
+  handle, staging = tempfile.mkstemp(dir=local_dir, prefix=".local-")
+  with os.fdopen(handle, "w") as f:
+    json.dump({"path": path, "size": stat.st_size, "mtime": stat.st_mtime,
+               "sha256": content_sha256}, f, indent=2)
+  os.rename(staging, info_path)
+  return content_sha256
+
+
+def fetch(source, directory=None, offline=None, refresh=False):
+  """Returns a local path holding the raw content of `source`.
+
+  Args:
+    source: A URL or a local file path.
+    directory: The cache directory (see `cache_dir`).
+    offline: If True, never download; if None, use `ML_DATASET_OFFLINE`.
+    refresh: If True, download a URL again even if it is cached, replacing
+      the cached copy and its hash.  Ignored for local files.
+  Returns:
+    A `(path, sha256)` pair for the local copy of the source.  A URL is
+    downloaded once and then served from the cache until `refresh` is set.
+    A local file is only hashed again when its size or modification time
+    changed.
+  Raises:
+    IOError: If the source is a URL that is not cached, or `refresh` is set,
+      while `offline` is set, or if a local source does not exist.
+  """
+  if not _is_url(source):
+    if not os.path.isfile(source):
+      raise IOError("No such data file: %s" % source)
+    return source, _local_sha256(source, directory)
+
+  source_dir = os.path.join(cache_dir(directory), "sources",
+                            _sha256(source)[:16])
+  info_path = os.path.join(source_dir, _SOURCE_INFO_FILE)
+  if os.path.isfile(info_path) and not refresh:
+    with open(info_path) as f:
+      info = json.load(f)
+    return os.path.join(source_dir, info["file"]), info["sha256"]
+
+  if _offline(offline):
+    raise IOError("%s is not in the dataset cache, or a refresh was "
+                  "requested, and offline mode is set" % source)
+  if not os.path.isdir(source_dir):
+    os.makedirs(source_dir)
+  file_name = source.rstrip("/").rsplit("/", 1)[-1] or "data"
+  # Download next to the final location and rename, so an interrupted
+  # download never leaves a truncated file behind that looks complete.
+  handle, staging = tempfile.mkstemp(dir=source_dir, prefix=".download-")
+  os.close(handle)
+  try:
+    urlretrieve(source, staging)
+    os.rename(staging, os.path.join(source_dir, file_name))
+  except Exception:
+    if os.path.exists(staging):
+      os.remove(staging)
+    raise
+  info = {"url": source, "file": file_name,
+          "sha256": file_sha256(os.path.join(source_dir, file_name))}
+  handle, staging = tempfile.mkstemp(dir=source_dir, prefix=".source-")
+  with os.fdopen(handle, "w") as f:
+    json.dump(info, f, indent=2)
+  os.rename(staging, info_path)
+  return os.path.join(source_dir, file_name), info["sha256"]
+
+
+def _parse_key(read_csv_kwargs):
+  return _sha256(json.dumps(read_csv_kwargs, sort_keys=True, default=repr))
+
+
+def local_path(source, directory=None, offline=None, refresh=False):
+  """Returns a local path of `source` without hashing local files.
+
+  For readers that parse the raw file anyway and do not need its content
+  hash: a local path is returned as is, and a URL is fetched through the
+  cache like `fetch` does.
+  """
+  if not _is_url(source):
+    if not os.path.isfile(source):
+      raise IOError("No such data file: %s" % source)
+    return source
+  return fetch(source, directory, offline, refresh)[0]
+
+
+def read_csv(source, cache_directory=None, offline=None,
+             decode_categorical=True, refresh=False, **read_csv_kwargs):
+  """Reads a CSV data set through the local cache.
+
+  Args:
+    source: A URL or a local file path of the CSV file.
+    cache_directory: The cache directory (see `cache_dir`).
+    offline: If True, never download; if None, use `ML_DATASET_OFFLINE`.
+    decode_categorical: If True, string columns come back as object columns
+      exactly like `pd.read_csv` returns them.  If False they keep the compact
+      `category` dtype of the stored dictionary encoding.
+    refresh: If True, download a URL source again, as for `fetch`.
+    **read_csv_kwargs: Arguments passed on to `pd.read_csv`, e.g. `names`,
+      `skipinitialspace` or `skiprows`.  They are part of the cache key.
+  Returns:
+    A Pandas DataFrame with the parsed data.
+  """
+  path, content_sha256 = fetch(source, cache_directory, offline, refresh)
+  table_dir = os.path.join(
+      cache_dir(cache_directory), "columnar-v%d" % columnar.FORMAT_VERSION,
+      "%s-%s" % (content_sha256[:16], _parse_key(read_csv_kwargs)[:16]))
+  if not columnar.is_table(table_dir):
+    dataframe = pd.read_csv(path, **read_csv_kwargs)
+    try:
+      columnar.write_table(dataframe, table_dir)
+    except OSError:
+      # Another process converted the same source first.
+      if not columnar.is_table(table_dir):
+        raise
+  return columnar.read_table(table_dir, decode_categorical)
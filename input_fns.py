@@ -0,0 +1,369 @@
+"""Input functions that feed the lab DataFrames to TensorFlow estimators.
+
+`input_fn(dataframe, numerical_columns, categorical_columns, label)` builds
+the same features and labels as the `input_fn` defined in labs 2-11, with
+the globals `NUMERICAL_COLUMNS`, `CATEGORICAL_COLUMNS` and `LABEL` passed in
+explicitly.  `make_input_fn` binds them into the zero-argument function the
+estimators expect:
+
+  train_input_fn = input_fns.make_input_fn(
+      training_examples, NUMERICAL_COLUMNS, CATEGORICAL_COLUMNS, LABEL)
+
+`make_dataset_input_fn` instead streams mini-batches through `tf.data`, from
+a DataFrame or from the columnar shards written by `chunked`, and
+`make_feeding_input_fn` feeds a DataFrame through placeholders; neither
+embeds the data in the graph.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+import columnar
+
+
+def sparse_indices(num_rows):
+  """Returns the indices of a [num_rows, 1] SparseTensor with one value per row.
+
+  The labs build these with `[[i, 0] for i in range(num_rows)]`, a Python
+  list of lists per categorical column that TensorFlow then has to convert
+  element by element.  This builds the same int64 array with NumPy, using
+  the expression that the labs with categorical features inline so they
+  stay standalone.
+
+  Args:
+    num_rows: The number of rows.
+  Returns:
+    An int64 array of shape [num_rows, 2].
+  """
+  return np.column_stack([np.arange(num_rows, dtype=np.int64),
+                          np.zeros(num_rows, dtype=np.int64)])
+
+
+def input_fn(dataframe, numerical_columns, categorical_columns, label=None):
+  """Constructs a dictionary for the feature columns.
+
+  Args:
+    dataframe: The Pandas DataFrame to use for the input.
+    numerical_columns: The names of the numerical features.
+    categorical_columns: The names of the categorical features.
+    label: The name of the label column, or None when predicting without
+      labels.
+  Returns:
+    The feature columns and the associated labels for the provided input.
+  """
+  # Creates a dictionary mapping each numerical feature column name (k) to
+  # the values of that column stored in a constant Tensor.
+  feature_cols = dict((k, tf.constant(dataframe[k].values))
+                      for k in numerical_columns)
+  # All categorical features share one set of indices, built once.
+  num_rows = len(dataframe)
+  indices = sparse_indices(num_rows)
+  for k in categorical_columns:
+    feature_cols[k] = tf.SparseTensor(
+        indices=indices,
+        values=np.asarray(dataframe[k].values),
+        dense_shape=[num_rows, 1])
+  if label is None:
+    return feature_cols
+  # Converts the label column into a constant Tensor.
+  return feature_cols, tf.constant(dataframe[label].values)
+
+
+def make_input_fn(dataframe, numerical_columns, categorical_columns,
+                  label=None):
+  """Returns a zero-argument `input_fn` over `dataframe` for an estimator."""
+  return lambda: input_fn(dataframe, numerical_columns, categorical_columns,
+                          label)
+
+
+def _encode_strings(values):
+  """Returns string values as a bytes array, as tf.string expects.
+
+  Missing values become b"", which `_dense_to_sparse` leaves out of the
+  SparseTensor.  Integer ids, e.g. from `vocabularies.encode_categorical`,
+  are kept as is.
+  """
+  values = np.asarray(values)
+  if values.dtype.kind in "Sbiu":
+    return values
+  encoded = np.char.encode(values.astype(np.str_), "utf-8")
+  encoded[pd.isnull(values)] = b""
+  return encoded
+
+
+def _dataframe_block(dataframe, columns, string_columns):
+  return dict((k, _encode_strings(dataframe[k].values) if k in string_columns
+               else np.asarray(dataframe[k].values)) for k in columns)
+
+
+def _shard_block(shard_dir, columns, string_columns):
+  """Memory-maps a columnar shard, decoding dictionary encoded columns."""
+  stored, vocabularies = columnar.open_table(shard_dir)
+  block = {}
+  for k in columns:
+    if k in vocabularies:
+      # Index the vocabulary with the codes; the extra last entry is what
+      # missing values (code -1) map to.
+      vocabulary = _encode_strings(list(vocabularies[k]) + [u""])
+      block[k] = vocabulary[stored[k]]
+    elif k in string_columns:
+      block[k] = _encode_strings(stored[k])
+    else:
+      block[k] = stored[k]
+  return block
+
+
+def _num_rows(block):
+  return len(next(iter(block.values())))
+
+
+def _batches(blocks, batch_size, shuffle_buffer, random_state):
+  """Regroups blocks of rows into batches, shuffling within a window.
+
+  Rows are collected until at least `shuffle_buffer` of them are pending,
+  shuffled, and emitted as batches; rows that do not fill a batch stay
+  pending.  Memory is bounded by the window plus one block.
+  """
+  pending = []
+  pending_rows = 0
+  window = max(shuffle_buffer or 0, batch_size)
+  for block in blocks:
+    pending.append(block)
+    pending_rows += _num_rows(block)
+    if pending_rows < window:
+      continue
+    rows = dict((k, np.concatenate([b[k] for b in pending]))
+                for k in pending[0])
+    if shuffle_buffer:
+      order = random_state.permutation(pending_rows)
+      rows = dict((k, v[order]) for k, v in rows.items())
+    num_full = pending_rows - pending_rows % batch_size
+    for start in range(0, num_full, batch_size):
+      yield dict((k, v[start:start + batch_size]) for k, v in rows.items())
+    pending = [dict((k, v[num_full:]) for k, v in rows.items())]
+    pending_rows -= num_full
+  if pending_rows:
+    rows = dict((k, np.concatenate([b[k] for b in pending]))
+                for k in pending[0])
+    if shuffle_buffer:
+      order = random_state.permutation(pending_rows)
+      rows = dict((k, v[order]) for k, v in rows.items())
+    for start in range(0, pending_rows, batch_size):
+      yield dict((k, v[start:start + batch_size]) for k, v in rows.items())
+
+
+def _tf_dtype(values):
+  if values.dtype.kind == "f":
+    return tf.float32
+  if values.dtype == np.int32:
+    return tf.int32
+  if values.dtype.kind in "biu":
+    return tf.int64
+  return tf.string
+
+
+def _dense_to_sparse(values):
+  """Converts a [batch] string tensor to the [batch, 1] SparseTensor that
+  the categorical feature columns expect.
+
+  Empty strings, i.e. missing values, get no entry, like the missing values
+  of the TFRecords from `tfrecords.write_tfrecords`.
+  """
+  num_rows = tf.shape(values, out_type=tf.int64)[0]
+  indices = tf.stack([tf.range(num_rows), tf.zeros([num_rows], tf.int64)],
+                     axis=1)
+  if values.dtype == tf.string:
+    present = tf.not_equal(values, "")
+    indices = tf.boolean_mask(indices, present)
+    values = tf.boolean_mask(values, present)
+  return tf.SparseTensor(indices=indices, values=values,
+                         dense_shape=tf.stack([num_rows, 1]))
+
+
+def make_dataset_input_fn(data, numerical_columns, categorical_columns,
+                          label=None, batch_size=128, shuffle_buffer=10000,
+                          num_epochs=None, prefetch=1, seed=None):
+  """Returns an `input_fn` that streams mini-batches through `tf.data`.
+
+  The `input_fn` from the labs puts every row into each training step, so a
+  step costs time proportional to the data set and the data must fit in a
+  constant.  This one reads `batch_size` rows per step from a DataFrame or
+  from the columnar shards written by `chunked.prepare_features_in_chunks`,
+  so step cost is independent of the data size:
+
+    train_input_fn = input_fns.make_dataset_input_fn(
+        training_examples, NUMERICAL_COLUMNS, CATEGORICAL_COLUMNS, LABEL,
+        batch_size=100)
+    model.fit(input_fn=train_input_fn, steps=steps_per_period)
+
+  Args:
+    data: A Pandas DataFrame, or a list of columnar shard directories.
+    numerical_columns: The names of the numerical features.
+    categorical_columns: The names of the categorical features.
+    label: The name of the label column, or None when predicting without
+      labels.
+    batch_size: The number of rows per batch.
+    shuffle_buffer: The minimum number of rows shuffled together, or 0 to
+      keep the rows in order, e.g. for evaluation.  A DataFrame is fully
+      shuffled every epoch; shards are read in a random order and shuffled
+      in windows of at least this many rows.
+    num_epochs: The number of passes over the data, or None to repeat
+      forever.  With a finite number, `evaluate` and `predict` stop at the
+      end of the data.
+    prefetch: The number of batches to prepare ahead of the training step.
+    seed: The random seed for shuffling, or None for a different order on
+      every call.  Every graph the `input_fn` is called in, e.g. every `fit`
+      of the labs' period loop, starts a new pass and uses the next seed
+      (seed, seed + 1, ...), so later periods do not replay the first
+      period's order.
+  Returns:
+    A zero-argument `input_fn` returning `(features, labels)`, or only the
+    features if `label` is None.
+  """
+  columns = list(numerical_columns) + list(categorical_columns)
+  if label is not None:
+    columns.append(label)
+  string_columns = set(categorical_columns)
+  if isinstance(data, pd.DataFrame):
+    dataframe_block = _dataframe_block(data, columns, string_columns)
+    open_blocks = [lambda: dataframe_block]
+  else:
+    if isinstance(data, str):
+      data = [data]
+    open_blocks = [lambda shard_dir=shard_dir: _shard_block(
+        shard_dir, columns, string_columns) for shard_dir in data]
+
+  calls = [0]
+
+  def generate():
+    random_state = np.random.RandomState(
+        None if seed is None else seed + calls[0])
+    calls[0] += 1
+    epoch = 0
+    while num_epochs is None or epoch < num_epochs:
+      order = np.arange(len(open_blocks))
+      if shuffle_buffer:
+        random_state.shuffle(order)
+      blocks = (open_blocks[i]() for i in order)
+      for batch in _batches(blocks, batch_size, shuffle_buffer, random_state):
+        yield batch
+      epoch += 1
+
+  first_block = open_blocks[0]()
+  output_types = dict((k, _tf_dtype(first_block[k])) for k in columns)
+  output_shapes = dict((k, tf.TensorShape([None])) for k in columns)
+
+  def dataset_input_fn():
+    dataset = tf.data.Dataset.from_generator(generate, output_types,
+                                             output_shapes)
+    # Cast the numerical features in the pipeline rather than in NumPy.
+    dataset = dataset.map(lambda batch: dict(
+        (k, tf.cast(v, tf.float32) if k in numerical_columns else v)
+        for k, v in batch.items()))
+    if prefetch:
+      dataset = dataset.prefetch(prefetch)
+    batch = dataset.make_one_shot_iterator().get_next()
+    features = dict((k, batch[k]) for k in numerical_columns)
+    for k in categorical_columns:
+      features[k] = _dense_to_sparse(batch[k])
+    if label is None:
+      return features
+    return features, batch[label]
+
+  return dataset_input_fn
+
+
+class IteratorInitializerHook(tf.train.SessionRunHook):
+  """Initializes a feeding iterator with its NumPy buffers.
+
+  The buffers are passed in the `feed_dict` of the iterator's initializer
+  when the session is created, so they never become part of the GraphDef.
+  """
+
+  def __init__(self):
+    self.initializer = None
+    self.feed_dict = None
+
+  def after_create_session(self, session, coord):
+    session.run(self.initializer, feed_dict=self.feed_dict)
+
+
+def make_feeding_input_fn(dataframe, numerical_columns, categorical_columns,
+                          label=None, batch_size=None, shuffle=True,
+                          num_epochs=None, seed=None):
+  """Returns an `input_fn` fed through placeholders and its session hook.
+
+  `input_fn` wraps every column in a `tf.constant`, so each `fit`, `evaluate`
+  and `predict` call serializes the whole DataFrame into a new GraphDef,
+  which is slow and fails beyond its 2GB limit.  Here the graph only holds
+  placeholders and an initializable iterator over them, and the returned
+  hook feeds the DataFrame's arrays when the session is created, so the
+  graph size does not depend on the number of rows:
+
+    train_input_fn, train_hook = input_fns.make_feeding_input_fn(
+        training_examples, NUMERICAL_COLUMNS, CATEGORICAL_COLUMNS, LABEL)
+    model.fit(input_fn=train_input_fn, steps=steps_per_period,
+              monitors=[train_hook])
+    model.evaluate(input_fn=validation_input_fn, steps=1,
+                   hooks=[validation_hook])
+
+  The `predict` methods of the contrib.learn estimators take no hooks; use
+  `make_dataset_input_fn(..., shuffle_buffer=0, num_epochs=1)` there, which
+  also keeps the data out of the graph.
+
+  Args:
+    dataframe: The Pandas DataFrame to use for the input.
+    numerical_columns: The names of the numerical features.
+    categorical_columns: The names of the categorical features.
+    label: The name of the label column, or None when predicting without
+      labels.
+    batch_size: The number of rows per step, or None to put every row in
+      each step as `input_fn` does.
+    shuffle: Whether to shuffle the rows every epoch when batching.
+    num_epochs: The number of passes over the data, or None to repeat
+      forever.
+    seed: The random seed for shuffling.  Every call of the `input_fn` uses
+      the next seed (seed, seed + 1, ...), as in `make_dataset_input_fn`.
+  Returns:
+    An `(input_fn, hook)` pair.  The hook must be passed to every call that
+    uses the `input_fn`.
+  """
+  columns = list(numerical_columns) + list(categorical_columns)
+  if label is not None:
+    columns.append(label)
+  string_columns = set(categorical_columns)
+  buffers = _dataframe_block(dataframe, columns, string_columns)
+  for k in numerical_columns:
+    buffers[k] = buffers[k].astype(np.float32, copy=False)
+  hook = IteratorInitializerHook()
+  calls = [0]
+
+  def feeding_input_fn():
+    placeholders = dict(
+        (k, tf.placeholder(_tf_dtype(buffers[k]), shape=[None], name=k))
+        for k in columns)
+    if batch_size is None:
+      dataset = tf.data.Dataset.from_tensors(placeholders)
+    else:
+      dataset = tf.data.Dataset.from_tensor_slices(placeholders)
+      if shuffle:
+        dataset = dataset.shuffle(
+            len(dataframe), seed=None if seed is None else seed + calls[0])
+        calls[0] += 1
+      dataset = dataset.batch(batch_size)
+    dataset = dataset.repeat(num_epochs)
+    iterator = dataset.make_initializable_iterator()
+    hook.initializer = iterator.initializer
+    hook.feed_dict = dict((placeholders[k], buffers[k]) for k in columns)
+    batch = iterator.get_next()
+    features = dict((k, batch[k]) for k in numerical_columns)
+    for k in categorical_columns:
+      features[k] = _dense_to_sparse(batch[k])
+    if label is None:
+      return features
+    return features, batch[label]
+
+  return feeding_input_fn, hook
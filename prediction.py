@@ -0,0 +1,125 @@
+"""Batched predictions as contiguous float32 NumPy arrays.
+
+The labs collect predictions with
+
+  predictions = np.array(list(model.predict_proba(input_fn=input_fn)))
+
+which makes the estimator yield one Python object per example.
+`predict_batches` yields whole batches of predictions instead, and
+`predict_into` writes them straight into a preallocated float32 array, a
+caller-supplied buffer or a memory-mapped .npy file:
+
+  input_fn = input_fns.make_dataset_input_fn(
+      validation_examples, NUMERICAL_COLUMNS, CATEGORICAL_COLUMNS,
+      batch_size=10000, shuffle_buffer=0, num_epochs=1)
+  probabilities = prediction.predict_into(model, input_fn,
+                                          len(validation_examples))
+  validation_log_loss = metrics.log_loss(validation_targets,
+                                         probabilities[:, 1])
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+import tensorflow as tf
+
+PROBABILITIES = "probabilities"
+SCORES = "scores"
+
+
+def _default_key(predictions):
+  if not isinstance(predictions, dict):
+    return None
+  for key in (PROBABILITIES, SCORES):
+    if key in predictions:
+      return key
+  raise ValueError("Choose one of the predictions: %s" %
+                   sorted(predictions))
+
+
+def predict_batches(model, input_fn, key=None):
+  """Yields the predictions of a trained estimator batch by batch.
+
+  The graph is built once and the latest checkpoint of `model.model_dir` is
+  restored once, as `predict` does, but the predictions are fetched a batch
+  at a time.
+
+  Args:
+    model: A trained `tf.contrib.learn` estimator.
+    input_fn: An `input_fn` returning the features, or features and labels,
+      that stops after one pass over the data, e.g. from
+      `input_fns.make_dataset_input_fn` with `num_epochs=1`.
+    key: The prediction to return, e.g. "probabilities", "classes" or
+      "scores".  Defaults to the probabilities of a classifier or the scores
+      of a regressor.
+  Yields:
+    A float32 array per batch, with the batch as its first dimension.
+  Raises:
+    NotFittedError: If `model.model_dir` has no checkpoint, as `predict`.
+  """
+  checkpoint_path = tf.train.latest_checkpoint(model.model_dir)
+  if not checkpoint_path:
+    raise tf.contrib.learn.NotFittedError(
+        "Couldn't find trained model at %s." % model.model_dir)
+  with tf.Graph().as_default():
+    features = input_fn()
+    if isinstance(features, tuple):
+      features = features[0]
+    predict_ops = model._get_predict_ops(features)  # pylint: disable=protected-access
+    predictions = predict_ops.predictions
+    if key is None:
+      key = _default_key(predictions)
+    if key is not None:
+      predictions = predictions[key]
+    session_creator = tf.train.ChiefSessionCreator(
+        scaffold=predict_ops.scaffold,
+        checkpoint_filename_with_path=checkpoint_path,
+        config=model.config.tf_config)
+    with tf.train.MonitoredSession(session_creator=session_creator) as session:
+      while not session.should_stop():
+        yield np.asarray(session.run(predictions), dtype=np.float32)
+
+
+def predict_into(model, input_fn, num_rows, key=None, out=None,
+                 output_path=None):
+  """Writes the predictions of a trained estimator into one array.
+
+  Args:
+    model: A trained `tf.contrib.learn` estimator.
+    input_fn: An `input_fn` as for `predict_batches`, yielding `num_rows`
+      examples in total.
+    num_rows: The number of examples.
+    key: The prediction to return, as for `predict_batches`.
+    out: A float32 array of `num_rows` rows to write into, or None.
+    output_path: A .npy file to create and write the predictions into
+      through a memory map when `out` is None, or None to allocate the
+      array in memory.  The file can be opened again with
+      `np.load(output_path, mmap_mode="r")`.
+  Returns:
+    The array holding the predictions: `out`, the memory-mapped array, or a
+    new array.
+  Raises:
+    NotFittedError: If `model.model_dir` has no checkpoint.
+    ValueError: If the input does not yield `num_rows` examples.
+  """
+  position = 0
+  for batch in predict_batches(model, input_fn, key):
+    if out is None:
+      shape = (num_rows,) + batch.shape[1:]
+      if output_path is None:
+        out = np.empty(shape, dtype=np.float32)
+      else:
+        out = np.lib.format.open_memmap(output_path, mode="w+",
+                                        dtype=np.float32, shape=shape)
+    if position + len(batch) > num_rows:
+      raise ValueError("The input yields more than %d examples" % num_rows)
+    out[position:position + len(batch)] = batch
+    position += len(batch)
+  if position != num_rows:
+    raise ValueError("The input yielded %d examples, expected %d" %
+                     (position, num_rows))
+  if out is None:
+    out = np.empty(0, dtype=np.float32)
+  if isinstance(out, np.memmap):
+    out.flush()
+  return out
@@ -0,0 +1,356 @@
+"""Quantile-based bucket boundaries for data that does not fit in memory.
+
+Labs 9-11 compute bucket boundaries with
+
+  def get_quantile_based_boundaries(feature_values, num_buckets):
+    boundaries = np.arange(1.0, num_buckets) / num_buckets
+    quantiles = feature_values.quantile(boundaries)
+    return [q for q in quantiles]
+
+which needs the whole column in one Series.  A `QuantileSketch` summarizes a
+column in a bounded amount of memory instead.  It can be updated chunk by
+chunk (e.g. with `chunked.iter_chunks`), and sketches built by separate
+workers over separate parts of the data can be merged.  Every sketch tracks a
+guaranteed bound on the rank error of the quantiles it returns:
+
+  sketch = quantiles.QuantileSketch()
+  for chunk in chunked.iter_chunks(CENSUS_CSV, names=COLUMNS):
+    sketch.update(chunk["age"])
+  boundaries, rank_error = quantiles.get_quantile_based_boundaries(sketch, 5)
+
+`compute_boundaries` does this for several columns in one scan and drops
+the duplicate boundaries that mostly-constant columns produce:
+
+  boundaries = quantiles.compute_boundaries(
+      training_examples, {"age": 5, "capital_gain": 100, "capital_loss": 100})
+  cap_gain_buckets = tf.contrib.layers.bucketized_column(
+      capital_gain, boundaries["capital_gain"].boundaries)
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_K = 4096
+
+
+class QuantileSketch(object):
+  """A mergeable approximate quantile sketch in the style of KLL.
+
+  Values are kept in a hierarchy of compactors.  Level h holds values that
+  each stand for 2**h of the original values.  When a level grows past
+  `2 * k` values it is sorted and every other value is promoted to the next
+  level, halving its size.  Such a compaction changes the rank of any value
+  by at most 2**h, so the sum of 2**h over all compactions is a guaranteed
+  bound on the absolute rank error of every quantile the sketch returns.
+  The normalized bound is at most log2(n / k) / k for n values, and memory is
+  at most 2 * k values per level.
+
+  Compactions alternate between keeping the even and the odd positions
+  rather than choosing at random, so a sketch built from the same data in
+  the same order always returns the same quantiles.
+  """
+
+  def __init__(self, k=DEFAULT_K):
+    """Creates an empty sketch.
+
+    Args:
+      k: The accuracy parameter.  Larger values use more memory and give
+        smaller rank errors.
+    """
+    if k < 2:
+      raise ValueError("k must be at least 2, got %d" % k)
+    self.k = k
+    self.levels = []
+    self.count = 0
+    self.max_rank_error = 0
+    self._offsets = []
+
+  def _compact(self):
+    level = 0
+    while level < len(self.levels):
+      if len(self.levels[level]) <= 2 * self.k:
+        level += 1
+        continue
+      values = np.sort(self.levels[level], kind="mergesort")
+      # With an odd number of values one stays behind so the total weight is
+      # unchanged.
+      kept = values[len(values) - len(values) % 2:]
+      paired = values[:len(values) - len(values) % 2]
+      promoted = paired[self._offsets[level]::2]
+      self._offsets[level] ^= 1
+      if level + 1 == len(self.levels):
+        self.levels.append(promoted)
+        self._offsets.append(0)
+      else:
+        self.levels[level + 1] = np.concatenate(
+            [self.levels[level + 1], promoted])
+      self.levels[level] = kept
+      self.max_rank_error += 2 ** level
+      level += 1
+
+  def update(self, values):
+    """Adds values to the sketch.  Missing values are ignored.
+
+    Args:
+      values: A Series or array of numbers.
+    Returns:
+      This sketch.
+    """
+    values = np.asarray(values, dtype=np.float64).ravel()
+    values = values[~np.isnan(values)]
+    if not len(values):
+      return self
+    if not self.levels:
+      self.levels.append(values)
+      self._offsets.append(0)
+    else:
+      self.levels[0] = np.concatenate([self.levels[0], values])
+    self.count += len(values)
+    self._compact()
+    return self
+
+  def merge(self, other):
+    """Merges another sketch into this one.
+
+    Args:
+      other: A `QuantileSketch` built over different values.
+    Returns:
+      This sketch, which now summarizes the values of both.
+    """
+    for level, values in enumerate(other.levels):
+      if level == len(self.levels):
+        self.levels.append(values.copy())
+        self._offsets.append(0)
+      else:
+        self.levels[level] = np.concatenate([self.levels[level], values])
+    self.count += other.count
+    self.max_rank_error += other.max_rank_error
+    self._compact()
+    return self
+
+  def rank_error(self):
+    """Returns the guaranteed rank error bound as a fraction of the count."""
+    if not self.count:
+      return 0.0
+    return self.max_rank_error / self.count
+
+  def quantiles(self, fractions):
+    """Returns approximate quantiles of the values added so far.
+
+    Args:
+      fractions: A list of fractions in [0, 1].
+    Returns:
+      An array with the value at each fraction.  The true rank of each value
+      is within `rank_error()` of the requested fraction.
+    """
+    fractions = np.asarray(fractions, dtype=np.float64)
+    if not self.count:
+      return np.full(fractions.shape, np.nan)
+    values = np.concatenate(self.levels)
+    weights = np.concatenate([np.full(len(v), 2 ** level, dtype=np.int64)
+                              for level, v in enumerate(self.levels)])
+    order = np.argsort(values, kind="mergesort")
+    values = values[order]
+    cumulative_weights = np.cumsum(weights[order])
+    ranks = np.ceil(fractions * self.count)
+    positions = np.searchsorted(cumulative_weights, np.maximum(ranks, 1))
+    return values[np.minimum(positions, len(values) - 1)]
+
+
+def sketch(values, k=DEFAULT_K):
+  """Builds a sketch over values or over an iterable of chunks of values.
+
+  Args:
+    values: A Series or array, or an iterable of them.
+    k: The accuracy parameter of the sketch.
+  Returns:
+    A `QuantileSketch`.
+  """
+  result = QuantileSketch(k)
+  if isinstance(values, (pd.Series, np.ndarray)):
+    return result.update(values)
+  for chunk in values:
+    result.update(chunk)
+  return result
+
+
+def get_quantile_based_boundaries(feature_values, num_buckets, k=DEFAULT_K):
+  """Computes bucket boundaries with the same number of values per bucket.
+
+  Args:
+    feature_values: A Series, an array, an iterable of chunks of values, or
+      a `QuantileSketch` built over them.
+    num_buckets: The number of buckets.
+    k: The accuracy parameter used when a sketch has to be built.
+  Returns:
+    A `(boundaries, rank_error)` pair: the list of `num_buckets - 1`
+    boundaries, and the guaranteed bound on how far the fraction of values
+    below each boundary is from the requested one.
+  """
+  if not isinstance(feature_values, QuantileSketch):
+    feature_values = sketch(feature_values, k)
+  fractions = np.arange(1.0, num_buckets) / num_buckets
+  boundaries = feature_values.quantiles(fractions)
+  return [float(b) for b in boundaries], feature_values.rank_error()
+
+
+BucketBoundaries = collections.namedtuple(
+    "BucketBoundaries",
+    ["boundaries", "num_buckets", "requested_buckets", "rank_error"])
+
+
+def deduplicate_boundaries(boundaries, min_val, max_val):
+  """Removes boundaries that would only create empty buckets.
+
+  A bucketized column puts values below the first boundary in their own
+  bucket, values between consecutive boundaries in one bucket each, and
+  values from the last boundary up in a final bucket.  Repeated boundaries,
+  e.g. the many quantiles equal to 0 of a mostly-zero column such as
+  `capital_gain`, and boundaries at or below the smallest value or above the
+  largest value therefore only add buckets that can never be hit.
+
+  Args:
+    boundaries: A sorted list of boundaries.
+    min_val: The smallest value of the column.
+    max_val: The largest value of the column.
+  Returns:
+    The sorted list of distinct boundaries in (min_val, max_val].  It is
+    empty for a constant column, which `bucketized_column` rejects; use the
+    column without bucketizing, or drop it, in that case.
+  """
+  return [float(b) for b in np.unique(boundaries) if min_val < b <= max_val]
+
+
+def compute_boundaries(data, num_buckets, k=DEFAULT_K):
+  """Computes bucket boundaries for several columns in a single scan.
+
+  Args:
+    data: A DataFrame, or an iterable of DataFrame chunks such as the one
+      returned by `chunked.iter_chunks`.
+    num_buckets: A dictionary mapping each column name to the requested
+      number of buckets, e.g. `{"age": 5, "capital_gain": 100}`.
+    k: The accuracy parameter of the sketches.
+  Returns:
+    A dictionary mapping each column name to a `BucketBoundaries` with the
+    deduplicated boundaries, the effective number of buckets they define,
+    the requested number of buckets and the rank error bound of the sketch.
+    A constant column gets no boundaries and a single bucket; check for
+    `num_buckets == 1` before passing the boundaries to `bucketized_column`,
+    which needs at least one.
+  """
+  if isinstance(data, pd.DataFrame):
+    data = [data]
+  sketches = dict((name, QuantileSketch(k)) for name in num_buckets)
+  min_vals = dict((name, np.inf) for name in num_buckets)
+  max_vals = dict((name, -np.inf) for name in num_buckets)
+  for chunk in data:
+    for name, column_sketch in sketches.items():
+      values = np.asarray(chunk[name], dtype=np.float64)
+      column_sketch.update(values)
+      if len(values) and not np.isnan(values).all():
+        min_vals[name] = min(min_vals[name], np.nanmin(values))
+        max_vals[name] = max(max_vals[name], np.nanmax(values))
+
+  results = {}
+  for name, requested in num_buckets.items():
+    boundaries, rank_error = get_quantile_based_boundaries(sketches[name],
+                                                           requested)
+    boundaries = deduplicate_boundaries(boundaries, min_vals[name],
+                                        max_vals[name])
+    results[name] = BucketBoundaries(boundaries, len(boundaries) + 1,
+                                     requested, rank_error)
+  return results
+
+
+def column_fingerprint(values):
+  """Returns a hex digest identifying the content of a column.
+
+  Args:
+    values: A Series or array of numbers.
+  Returns:
+    The SHA-256 of the column's length and float64 values.
+  """
+  values = np.ascontiguousarray(values, dtype=np.float64)
+  digest = hashlib.sha256(("%d:" % len(values)).encode("ascii"))
+  digest.update(values.tobytes())
+  return digest.hexdigest()
+
+
+class BoundaryCache(object):
+  """Remembers bucket boundaries across `construct_feature_columns` calls.
+
+  `define_linear_classifier` and `define_DNN_classifier` call
+  `construct_feature_columns`, and with it `get_quantile_based_boundaries`,
+  for every model defined, so a hyperparameter sweep recomputes the same
+  quantiles of `training_examples` for every trial.  A cache keyed by the
+  column's fingerprint and the bucket count computes them once:
+
+    boundary_cache = quantiles.BoundaryCache("/tmp/boundaries.json")
+    ...
+    boundaries = boundary_cache.get_quantile_based_boundaries(
+        training_examples["age"], 5)
+
+  With a path the cache is saved to disk after every new entry, so later
+  runs and other processes of a sweep reuse the boundaries too.  Floats are
+  stored with their exact decimal representation, so reused boundaries are
+  bit-identical to the computed ones.
+  """
+
+  def __init__(self, path=None):
+    """Creates a cache, loading the entries saved at `path` if any.
+
+    Args:
+      path: The JSON file to persist the cache to, or None to keep it in
+        memory only.
+    """
+    self.path = path
+    self.entries = {}
+    self.hits = 0
+    self.misses = 0
+    if path is not None and os.path.isfile(path):
+      with open(path) as f:
+        self.entries = json.load(f)
+
+  def save(self):
+    """Writes the cache to its path, replacing the file atomically."""
+    if self.path is None:
+      return
+    directory = os.path.dirname(os.path.abspath(self.path))
+    handle, staging = tempfile.mkstemp(dir=directory, prefix=".boundaries-")
+    with os.fdopen(handle, "w") as f:
+      json.dump(self.entries, f, sort_keys=True)
+    os.rename(staging, self.path)
+
+  def get_quantile_based_boundaries(self, feature_values, num_buckets,
+                                    deduplicate=False):
+    """Returns the boundaries for a column, computing them on a miss.
+
+    Args:
+      feature_values: A Series or array of numbers.
+      num_buckets: The requested number of buckets.
+      deduplicate: Whether to apply `deduplicate_boundaries`.
+    Returns:
+      The list of boundaries.
+    """
+    key = "%s:%d:%d" % (column_fingerprint(feature_values), num_buckets,
+                        int(deduplicate))
+    if key in self.entries:
+      self.hits += 1
+      return list(self.entries[key])
+    self.misses += 1
+    boundaries, _ = get_quantile_based_boundaries(feature_values, num_buckets)
+    if deduplicate:
+      values = np.asarray(feature_values, dtype=np.float64)
+      boundaries = deduplicate_boundaries(boundaries, np.nanmin(values),
+                                          np.nanmax(values))
+    self.entries[key] = boundaries
+    self.save()
+    return list(boundaries)
@@ -0,0 +1,121 @@
+"""Tests for the quantile sketch and the bucket boundaries built on it."""
+
+from __future__ import absolute_import, division, print_function
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import quantiles
+
+FRACTIONS = np.linspace(0.0, 1.0, 41)
+
+
+def observed_rank_error(values, fractions, estimates):
+  """Returns the largest distance between requested and true ranks.
+
+  The true rank of an estimate is any fraction between the values strictly
+  below it and the values up to and including it, so ties count as exact.
+  """
+  values = np.sort(values)
+  below = np.searchsorted(values, estimates, side="left") / len(values)
+  up_to = np.searchsorted(values, estimates, side="right") / len(values)
+  return np.max(np.maximum(below - fractions, 0) +
+                np.maximum(fractions - up_to, 0))
+
+
+class QuantileSketchTest(unittest.TestCase):
+
+  def assertWithinBound(self, sketch, values):
+    estimates = sketch.quantiles(FRACTIONS)
+    # ceil(fraction * count) can land one value past the requested rank.
+    bound = sketch.rank_error() + 1.0 / len(values)
+    self.assertLessEqual(observed_rank_error(values, FRACTIONS, estimates),
+                         bound)
+
+  def testExactWithoutCompaction(self):
+    values = np.random.RandomState(0).normal(size=100)
+    sketch = quantiles.QuantileSketch(k=64).update(values)
+    self.assertEqual(sketch.rank_error(), 0.0)
+    self.assertWithinBound(sketch, values)
+
+  def testChunkedUpdatesStayWithinBound(self):
+    random_state = np.random.RandomState(1)
+    for values in (random_state.lognormal(8.0, 1.0, 200000),
+                   random_state.randint(0, 50, 200000).astype(np.float64),
+                   np.sort(random_state.uniform(size=200000))):
+      sketch = quantiles.QuantileSketch(k=64)
+      for chunk in np.array_split(values, 37):
+        sketch.update(chunk)
+      self.assertEqual(sketch.count, len(values))
+      self.assertGreater(sketch.rank_error(), 0.0)
+      self.assertWithinBound(sketch, values)
+
+  def testMergeStaysWithinBound(self):
+    random_state = np.random.RandomState(2)
+    parts = [random_state.normal(loc, 1.0, size)
+             for loc, size in ((0.0, 50000), (5.0, 80000), (-3.0, 30000))]
+    merged = quantiles.QuantileSketch(k=64)
+    for part in parts:
+      sketch = quantiles.QuantileSketch(k=64)
+      for chunk in np.array_split(part, 7):
+        sketch.update(chunk)
+      merged.merge(sketch)
+    values = np.concatenate(parts)
+    self.assertEqual(merged.count, len(values))
+    self.assertWithinBound(merged, values)
+
+  def testIgnoresMissingValues(self):
+    values = np.arange(1000, dtype=np.float64)
+    sketch = quantiles.QuantileSketch(k=16).update(
+        np.concatenate([values, [np.nan] * 100]))
+    self.assertEqual(sketch.count, 1000)
+    self.assertWithinBound(sketch, values)
+
+
+class ComputeBoundariesTest(unittest.TestCase):
+
+  def testMostlyZeroColumnDropsEmptyBuckets(self):
+    random_state = np.random.RandomState(3)
+    capital_gain = np.zeros(5000)
+    capital_gain[:250] = random_state.lognormal(8.0, 1.0, 250)
+    result = quantiles.compute_boundaries(
+        pd.DataFrame({"capital_gain": capital_gain}), {"capital_gain": 100})
+    boundaries = result["capital_gain"]
+    self.assertEqual(boundaries.requested_buckets, 100)
+    self.assertLess(boundaries.num_buckets, 10)
+    self.assertEqual(boundaries.num_buckets, len(boundaries.boundaries) + 1)
+    self.assertGreater(min(boundaries.boundaries), 0.0)
+    self.assertLessEqual(max(boundaries.boundaries), capital_gain.max())
+    self.assertEqual(boundaries.boundaries,
+                     sorted(set(boundaries.boundaries)))
+
+  def testConstantColumnHasNoBoundaries(self):
+    result = quantiles.compute_boundaries(
+        pd.DataFrame({"constant": np.full(100, 7.0)}), {"constant": 5})
+    self.assertEqual(result["constant"].boundaries, [])
+    self.assertEqual(result["constant"].num_buckets, 1)
+
+  def testChunksMatchASingleDataFrame(self):
+    random_state = np.random.RandomState(4)
+    dataframe = pd.DataFrame({
+        "age": random_state.randint(17, 90, 5000).astype(np.float64),
+        "hours": random_state.normal(40.0, 10.0, 5000)})
+    dataframe.loc[::17, "hours"] = np.nan
+    num_buckets = {"age": 5, "hours": 10}
+    whole = quantiles.compute_boundaries(dataframe, num_buckets)
+    chunks = (dataframe.iloc[start:start + 700]
+              for start in range(0, len(dataframe), 700))
+    chunked = quantiles.compute_boundaries(chunks, num_buckets)
+    self.assertEqual(chunked, whole)
+
+  def testDeduplicateBoundaries(self):
+    self.assertEqual(
+        quantiles.deduplicate_boundaries([0.0, 0.0, 1.0, 1.0, 5.0, 9.0],
+                                         0.0, 5.0),
+        [1.0, 5.0])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,216 @@
+"""Typed schemas for the lab data sets.
+
+Without dtypes, `pd.read_csv` parses the car data's `price`, `horsepower`,
+`peak-rpm` and mpg columns as object strings because missing entries are
+written as '?'.  The labs then fix each column up in a second pass:
+
+  car_data['price'] = pd.to_numeric(car_data['price'], errors='coerce')
+  ...
+  car_data.fillna(car_data.mean(), inplace=True)
+
+A `Schema` declares the dtype, missing-value sentinels and categorical-ness of
+every column once, and `read_csv` applies it at parse time so each column
+comes out as `float32`, `int32` or `category` in a single pass:
+
+  car_data = schemas.read_csv(CARS_URL, schemas.CARS, fill_na="mean")
+  census_df = schemas.read_csv(CENSUS_URL, schemas.CENSUS)
+
+`Schema.read_csv_kwargs()` returns the same arguments for use with
+`dataset_cache.read_csv` or `chunked.prepare_features_in_chunks`.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+
+import pandas as pd
+
+import dataset_cache
+
+CATEGORY = "category"
+
+Column = collections.namedtuple("Column", ["name", "dtype", "na_values"])
+
+
+def column(name, dtype, na_values=()):
+  """Declares a column of a schema.
+
+  Args:
+    name: The column name.
+    dtype: The dtype to parse the column as, e.g. "float32", "int32" or
+      `CATEGORY`.
+    na_values: Strings that mark a missing value in this column.
+  Returns:
+    A `Column`.
+  """
+  return Column(name, dtype, tuple(na_values))
+
+
+class Schema(object):
+  """The ordered, typed columns of a CSV data set."""
+
+  def __init__(self, name, columns, header=False, read_csv_kwargs=None):
+    """Creates a schema.
+
+    Args:
+      name: The name the schema is registered under.
+      columns: The list of `Column`s in file order.
+      header: Whether the file starts with a header row.  If not, the column
+        names are passed to `pd.read_csv` as `names`.
+      read_csv_kwargs: Further arguments the file needs to parse, e.g.
+        `skipinitialspace`.
+    """
+    self.name = name
+    self.columns = list(columns)
+    self.header = header
+    self._read_csv_kwargs = dict(read_csv_kwargs or {})
+
+  @property
+  def names(self):
+    return [c.name for c in self.columns]
+
+  @property
+  def numerical_columns(self):
+    return [c.name for c in self.columns if c.dtype != CATEGORY]
+
+  @property
+  def categorical_columns(self):
+    return [c.name for c in self.columns if c.dtype == CATEGORY]
+
+  def read_csv_kwargs(self, **overrides):
+    """Returns the `pd.read_csv` arguments that apply this schema.
+
+    Args:
+      **overrides: Arguments to add or replace, e.g. `skiprows=1` for the
+        census test file.
+    Returns:
+      A dictionary of keyword arguments for `pd.read_csv`.
+    """
+    kwargs = dict(self._read_csv_kwargs)
+    kwargs["dtype"] = dict((c.name, c.dtype) for c in self.columns)
+    na_values = dict((c.name, list(c.na_values))
+                     for c in self.columns if c.na_values)
+    if na_values:
+      kwargs["na_values"] = na_values
+    if self.header:
+      kwargs["header"] = 0
+    else:
+      kwargs["header"] = None
+      kwargs["names"] = self.names
+    kwargs.update(overrides)
+    return kwargs
+
+
+SCHEMAS = {}
+
+
+def register(schema):
+  """Adds a schema to `SCHEMAS` and returns it."""
+  if schema.name in SCHEMAS:
+    raise ValueError("A schema named %r is already registered" % schema.name)
+  SCHEMAS[schema.name] = schema
+  return schema
+
+
+def get(name):
+  """Returns the registered schema called `name`."""
+  try:
+    return SCHEMAS[name]
+  except KeyError:
+    raise ValueError("Unknown schema %r, expected one of %s"
+                     % (name, sorted(SCHEMAS)))
+
+
+def read_csv(source, schema, fill_na=None, **overrides):
+  """Parses a CSV file with the dtypes declared by `schema`.
+
+  Args:
+    source: A URL or local path; URLs are fetched through `dataset_cache`.
+    schema: A `Schema` or the name of a registered one.
+    fill_na: None to keep missing numerical values as NaN, or "mean" or
+      "median" to replace them by that statistic of their column.
+    **overrides: Further `pd.read_csv` arguments, see
+      `Schema.read_csv_kwargs`.
+  Returns:
+    A Pandas DataFrame with typed columns.
+  """
+  if not isinstance(schema, Schema):
+    schema = get(schema)
+  path = dataset_cache.local_path(source)
+  dataframe = pd.read_csv(path, **schema.read_csv_kwargs(**overrides))
+  if fill_na is not None:
+    numerical = dataframe[schema.numerical_columns]
+    if fill_na == "mean":
+      fill_values = numerical.mean()
+    elif fill_na == "median":
+      fill_values = numerical.median()
+    else:
+      raise ValueError("fill_na must be None, 'mean' or 'median', got %r"
+                       % (fill_na,))
+    dataframe.fillna(fill_values, inplace=True)
+  return dataframe
+
+
+# The 1985 Ward's Automotive Yearbook data used in labs 1-5.  Missing entries
+# are written as '?'.
+CARS = register(Schema("cars", [
+    column("symboling", "float32"),
+    column("losses", "float32", na_values=["?"]),
+    column("make", CATEGORY),
+    column("fuel-type", CATEGORY),
+    column("aspiration", CATEGORY),
+    column("num-doors", CATEGORY),
+    column("body-style", CATEGORY),
+    column("drive-wheels", CATEGORY),
+    column("engine-location", CATEGORY),
+    column("wheel-base", "float32"),
+    column("length", "float32"),
+    column("width", "float32"),
+    column("height", "float32"),
+    column("weight", "float32"),
+    column("engine-type", CATEGORY),
+    column("num-cylinders", CATEGORY),
+    column("engine-size", "float32"),
+    column("fuel-system", CATEGORY),
+    column("bore", "float32", na_values=["?"]),
+    column("stroke", "float32", na_values=["?"]),
+    column("compression-ratio", "float32"),
+    column("horsepower", "float32", na_values=["?"]),
+    column("peak-rpm", "float32", na_values=["?"]),
+    column("city-mpg", "float32", na_values=["?"]),
+    column("highway-mpg", "float32", na_values=["?"]),
+    column("price", "float32", na_values=["?"]),
+], read_csv_kwargs={"sep": ",", "encoding": "latin-1"}))
+
+# The California housing data used in labs 6 and 7.  The file has a header.
+CALIFORNIA_HOUSING = register(Schema("california_housing", [
+    column("longitude", "float32"),
+    column("latitude", "float32"),
+    column("housing_median_age", "float32"),
+    column("total_rooms", "float32"),
+    column("total_bedrooms", "float32"),
+    column("population", "float32"),
+    column("households", "float32"),
+    column("median_income", "float32"),
+    column("median_house_value", "float32"),
+], header=True, read_csv_kwargs={"sep": ","}))
+
+# The UCI census (adult) data used in labs 8-11.  Unknown categorical values
+# are written as '?' and are kept as a category of their own, as in the labs.
+CENSUS = register(Schema("census", [
+    column("age", "int32"),
+    column("workclass", CATEGORY),
+    column("sample_weight", "int32"),
+    column("education", CATEGORY),
+    column("education_num", "int32"),
+    column("marital_status", CATEGORY),
+    column("occupation", CATEGORY),
+    column("relationship", CATEGORY),
+    column("race", CATEGORY),
+    column("gender", CATEGORY),
+    column("capital_gain", "int32"),
+    column("capital_loss", "int32"),
+    column("hours_per_week", "int32"),
+    column("native_country", CATEGORY),
+    column("income_bracket", CATEGORY),
+], read_csv_kwargs={"skipinitialspace": True}))
@@ -0,0 +1,104 @@
+"""Loss metrics computed in the graph while streaming over batches.
+
+The labs compute their losses with
+
+  def compute_loss(model, input_fn, targets):
+    predictions = np.array(list(model.predict_proba(input_fn=input_fn)))
+    return metrics.log_loss(targets, predictions[:, 1])
+
+which yields one Python object per example and keeps all of them in
+memory.  The `MetricSpec`s here make `model.evaluate` accumulate the same
+losses batch by batch inside the graph instead, so only a few scalars are
+kept whatever the data size:
+
+  input_fn = input_fns.make_dataset_input_fn(
+      validation_examples, NUMERICAL_COLUMNS, CATEGORICAL_COLUMNS, LABEL,
+      batch_size=1000, shuffle_buffer=0, num_epochs=1)
+  validation_metrics = streaming_metrics.evaluate(
+      model, input_fn, streaming_metrics.classification_metrics())
+  validation_log_loss = validation_metrics["log_loss"]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import tensorflow as tf
+
+# The probabilities are clipped like in sklearn.metrics.log_loss.
+LOG_LOSS_EPSILON = 1e-15
+DEFAULT_AUC_THRESHOLDS = 1000
+
+
+def _flat(tensor):
+  return tf.reshape(tf.to_float(tensor), [-1])
+
+
+def _positive_probabilities(predictions):
+  """Returns the probability of class 1 from [batch, 2] probabilities."""
+  return tf.reshape(predictions[:, 1], [-1])
+
+
+def streaming_log_loss(predictions, labels, weights=None):
+  """The mean binary log loss of the probabilities of class 1."""
+  probabilities = tf.clip_by_value(_positive_probabilities(predictions),
+                                   LOG_LOSS_EPSILON, 1 - LOG_LOSS_EPSILON)
+  labels = _flat(labels)
+  losses = -(labels * tf.log(probabilities) +
+             (1 - labels) * tf.log(1 - probabilities))
+  return tf.contrib.metrics.streaming_mean(losses, weights=weights)
+
+
+def streaming_rmse(predictions, labels, weights=None):
+  """The root mean squared error of the regression predictions."""
+  return tf.contrib.metrics.streaming_root_mean_squared_error(
+      _flat(predictions), _flat(labels), weights=weights)
+
+
+def streaming_auc(predictions, labels, weights=None,
+                  num_thresholds=DEFAULT_AUC_THRESHOLDS):
+  """The area under the ROC curve of the probabilities of class 1.
+
+  The curve is approximated with `num_thresholds` evenly spaced thresholds,
+  so memory stays constant; the result is within about 1 / num_thresholds of
+  `sklearn.metrics.roc_auc_score`.
+  """
+  return tf.contrib.metrics.streaming_auc(
+      _positive_probabilities(predictions), tf.cast(_flat(labels), tf.bool),
+      weights=weights, num_thresholds=num_thresholds)
+
+
+def classification_metrics():
+  """Returns the `metrics` argument for a binary classifier's `evaluate`."""
+  probabilities = tf.contrib.learn.PredictionKey.PROBABILITIES
+  return {
+      "log_loss": tf.contrib.learn.MetricSpec(
+          metric_fn=streaming_log_loss, prediction_key=probabilities),
+      "roc_auc": tf.contrib.learn.MetricSpec(
+          metric_fn=streaming_auc, prediction_key=probabilities),
+  }
+
+
+def regression_metrics():
+  """Returns the `metrics` argument for a regressor's `evaluate`."""
+  return {
+      "rmse": tf.contrib.learn.MetricSpec(
+          metric_fn=streaming_rmse,
+          prediction_key=tf.contrib.learn.PredictionKey.SCORES),
+  }
+
+
+def evaluate(model, input_fn, metrics, steps=None):
+  """Evaluates streaming metrics over a whole data set.
+
+  Args:
+    model: A `tf.contrib.learn` estimator.
+    input_fn: An `input_fn` that stops after one pass over the data, e.g.
+      from `input_fns.make_dataset_input_fn` with `num_epochs=1`, or one
+      whose batch holds all the examples when `steps` is 1.
+    metrics: A dictionary of `MetricSpec`s, e.g. `classification_metrics()`.
+    steps: The number of batches to evaluate, or None to read until the
+      `input_fn` is exhausted.
+  Returns:
+    A dictionary mapping metric names to scalars, including the metrics the
+    estimator always reports such as "loss".
+  """
+  return model.evaluate(input_fn=input_fn, steps=steps, metrics=metrics)
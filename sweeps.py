@@ -0,0 +1,186 @@
+"""Hyperparameter sweeps that train several configurations in parallel.
+
+The labs tune `learning_rate`, `steps`, `hidden_units` and the
+regularization strengths by hand, one `define_*` and `train_model` call at
+a time.  `run_sweep` trains the configurations of a grid or a random search
+in a pool of worker processes and collects their metrics in one table:
+
+  def train_and_evaluate(params, training_examples, validation_examples):
+    model = define_linear_classifier(params["learning_rate"],
+                                     params["l1_regularization_strength"])
+    ...
+    return {"validation_loss": loss, "auc": auc,
+            "model_size": sweeps.model_size(model)}
+
+  results = sweeps.run_sweep(
+      train_and_evaluate,
+      sweeps.grid({"learning_rate": [0.5, 1.0, 2.0],
+                   "l1_regularization_strength": [0.0, 0.1, 1.0]}),
+      {"training_examples": training_examples,
+       "validation_examples": validation_examples})
+  results.sort_values("validation_loss")
+
+`train_fn` must be a module-level function so the workers can unpickle it.
+The data sets are written once with `columnar.write_table`, in /dev/shm
+when it exists, and every worker maps them once when it starts with
+`columnar.read_table`, whose numerical columns are copy-on-write memory maps:
+the workers share one copy of the data and the configurations are the only
+thing sent to them.  The workers therefore see the data as stored by
+`columnar`: float columns narrowed to float32, integer columns to int32 and
+string columns as `category` columns.  Narrow the DataFrames the same way
+(e.g. with `columnar.read_table`) before a serial run that should reproduce
+a sweep's results exactly.
+
+Create the sweep before running any TensorFlow session in the parent
+process, since the workers are forked from it.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+import columnar
+
+_SHARED_MEMORY_DIR = "/dev/shm"
+
+# The data sets and training function of a worker process, set once by
+# `_init_worker`.
+_worker_datasets = {}
+_worker_train_fn = None
+
+
+def grid(space):
+  """Returns every combination of the values in `space`.
+
+  Args:
+    space: A dictionary mapping each hyperparameter name to a list of values.
+  Returns:
+    A list of dictionaries mapping hyperparameter names to values.
+  """
+  names = sorted(space)
+  return [dict(zip(names, values))
+          for values in itertools.product(*(space[name] for name in names))]
+
+
+def log_uniform(low, high):
+  """Returns a sampler drawing values uniformly on a log scale."""
+  return lambda random_state: float(
+      np.exp(random_state.uniform(np.log(low), np.log(high))))
+
+
+def random_search(space, num_trials, seed=None):
+  """Returns `num_trials` random configurations drawn from `space`.
+
+  Args:
+    space: A dictionary mapping each hyperparameter name to a list of values
+      to choose from, a function drawing a value from a
+      `np.random.RandomState` (e.g. `log_uniform(0.01, 10.0)`), or a single
+      value.
+    num_trials: The number of configurations.
+    seed: The random seed.
+  Returns:
+    A list of dictionaries mapping hyperparameter names to values.
+  """
+  random_state = np.random.RandomState(seed)
+  configurations = []
+  for _ in range(num_trials):
+    params = {}
+    for name in sorted(space):
+      values = space[name]
+      if callable(values):
+        params[name] = values(random_state)
+      elif isinstance(values, (list, tuple)):
+        params[name] = values[random_state.randint(len(values))]
+      else:
+        params[name] = values
+    configurations.append(params)
+  return configurations
+
+
+def model_size(estimator):
+  """Counts the non-zero weights of a model, as in lab 10."""
+  size = 0
+  for variable in estimator.get_variable_names():
+    if not any(x in variable for x in ["global_step", "centered_bias_weight",
+                                       "bias_weight", "Ftrl"]):
+      size += np.count_nonzero(estimator.get_variable_value(variable))
+  return size
+
+
+def _init_worker(train_fn, dataset_dirs):
+  # read_table maps the numerical columns instead of copying them, so all
+  # workers share the pages of the stored tables.
+  global _worker_train_fn
+  _worker_train_fn = train_fn
+  for name, directory in dataset_dirs.items():
+    _worker_datasets[name] = columnar.read_table(directory)
+
+
+def _run_trial(trial):
+  index, params = trial
+  start = time.time()
+  try:
+    metrics = _worker_train_fn(params, **_worker_datasets)
+    error = None
+  except Exception:  # pylint: disable=broad-except
+    metrics = {}
+    error = traceback.format_exc()
+  return index, metrics, time.time() - start, error
+
+
+def run_sweep(train_fn, configurations, datasets, num_workers=None,
+              directory=None):
+  """Trains every configuration in a pool of processes.
+
+  Args:
+    train_fn: A module-level function called as
+      `train_fn(params, **datasets)` in a worker, returning a dictionary of
+      metrics such as the losses, the AUC and the `model_size`.
+    configurations: A list of hyperparameter dictionaries, e.g. from `grid`
+      or `random_search`.
+    datasets: A dictionary mapping argument names of `train_fn` to the
+      DataFrames it needs.  They arrive with float32 and int32 numerical
+      columns and `category` string columns, as stored by `columnar`.
+    num_workers: The number of processes, by default one per core.
+    directory: Where to store the data sets while the sweep runs.  Defaults
+      to a temporary directory in /dev/shm if it exists.
+  Returns:
+    A DataFrame with one row per configuration: its hyperparameters, the
+    metrics it returned, the seconds it took and the traceback of its
+    error, if any.
+  """
+  if directory is None and os.path.isdir(_SHARED_MEMORY_DIR):
+    directory = _SHARED_MEMORY_DIR
+  staging = tempfile.mkdtemp(dir=directory, prefix="sweep-")
+  try:
+    dataset_dirs = dict(
+        (name, columnar.write_table(dataframe, os.path.join(staging, name)))
+        for name, dataframe in datasets.items())
+    pool = multiprocessing.Pool(num_workers, initializer=_init_worker,
+                                initargs=(train_fn, dataset_dirs))
+    try:
+      results = sorted(pool.imap_unordered(_run_trial,
+                                           enumerate(configurations)))
+    finally:
+      pool.close()
+      pool.join()
+  finally:
+    shutil.rmtree(staging, ignore_errors=True)
+
+  rows = []
+  for index, metrics, seconds, error in results:
+    row = dict(configurations[index])
+    row.update(metrics)
+    row["seconds"] = seconds
+    row["error"] = error
+    rows.append(row)
+  return pd.DataFrame(rows)
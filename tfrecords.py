@@ -0,0 +1,583 @@
+"""Reading batches of `tf.train.Example` records from TFRecord files.
+
+Lab 12 reads its TFRecords with `tf.contrib.learn.io.read_batch_features`
+and the default of one reader thread.  `read_batch_features` here exposes
+the reader and parser parallelism and the queue sizes, and
+`measure_throughput` reports how many examples per second a configuration
+delivers, so the options can be sized to the machine:
+
+  input_fn = lambda: tfrecords.read_batch_features(
+      "/tmp/train-*.tfrecord", features_to_types_dict,
+      reader_num_threads=4, parser_num_threads=4)
+  print(tfrecords.measure_throughput(input_fn))
+
+`benchmarks/tfrecord_input_benchmark.py` sweeps the thread counts.
+
+`write_tfrecords` exports the DataFrames of the other labs in the same
+format, so every model can train through this reader:
+
+  paths, features_to_types_dict = tfrecords.write_tfrecords(
+      training_examples, "/tmp/census/train", NUMERICAL_COLUMNS,
+      CATEGORICAL_COLUMNS, LABEL, num_shards=8, compression="GZIP")
+  input_fn = lambda: tfrecords.read_batch_features(
+      "/tmp/census/train-*.tfrecord", features_to_types_dict, label=LABEL,
+      compression="GZIP")
+
+`tokenize_terms` rewrites the lab 12 TFRecords with int64 term ids, which
+`term_id_features_to_types_dict` parses without any string handling, and
+a `DecodedExampleCache` keeps decoded examples in memory across epochs and
+evaluations.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+DEFAULT_BATCH_SIZE = 250
+
+
+def _reader(compression):
+  """Returns the `reader` argument for `read_batch_features`."""
+  if compression is None:
+    return tf.TFRecordReader
+  options = tf.python_io.TFRecordOptions(_compression_type(compression))
+  return lambda: tf.TFRecordReader(options=options)
+
+
+def _compression_type(compression):
+  if compression is None:
+    return tf.python_io.TFRecordCompressionType.NONE
+  return getattr(tf.python_io.TFRecordCompressionType, compression.upper())
+
+
+def read_batch_features(file_pattern, features, label="labels",
+                        batch_size=DEFAULT_BATCH_SIZE, shuffle=True,
+                        num_epochs=None, seed=None, reader_num_threads=1,
+                        parser_num_threads=2, read_batch_size=None,
+                        queue_capacity=10000, feature_queue_capacity=100,
+                        compression=None):
+  """Reads and parses batches of examples and splits off the label.
+
+  Args:
+    file_pattern: A glob pattern or list of TFRecord files.  With sharded
+      files such as "train-*.tfrecord" each reader thread reads a different
+      file, so the shards are interleaved.
+    features: The parse spec, e.g. lab 12's `features_to_types_dict`.
+    label: The name of the label feature, or None to return only features.
+    batch_size: The number of examples per batch.
+    shuffle: Whether to read the files in a random order and shuffle the
+      records in a buffer of `queue_capacity` records.
+    num_epochs: The number of passes over the files, or None to repeat
+      forever.  A finite number needs the local variables initialized, which
+      the estimators do.
+    seed: The random seed.  `tf.contrib.learn.io.read_batch_features` takes
+      no seed, so this sets the graph-level seed, which replaces the
+      estimator's `config.tf_random_seed` and also seeds the model's
+      initialization.  It only biases the order: the parser threads race to
+      enqueue batches and what the shuffle queue yields depends on how full
+      it is, so the order is not reproducible.  Use `shuffle=False` with
+      `parser_num_threads=1` for a fixed order, e.g. to evaluate the same
+      batch every period.  Every call starts reading from the beginning, so
+      pass a different seed to each `fit` of a period loop.
+    reader_num_threads: The number of threads reading records.
+    parser_num_threads: The number of threads parsing the records and
+      filling the queue of parsed batches.
+    read_batch_size: The number of records each reader reads at once.
+      Defaults to `batch_size`.
+    queue_capacity: The capacity of the queue of serialized records, which
+      is also the buffer they are shuffled in.
+    feature_queue_capacity: The capacity of the queue of parsed batches,
+      i.e. how many batches are prefetched ahead of the training step.
+    compression: None, or "GZIP" or "ZLIB" for compressed files.
+  Returns:
+    A `(features, labels)` pair of dictionaries of tensors, or only the
+    features if `label` is None.
+  """
+  if seed is not None:
+    tf.set_random_seed(seed)
+  batch = tf.contrib.learn.io.read_batch_features(
+      file_pattern=file_pattern,
+      batch_size=batch_size,
+      features=features,
+      reader=_reader(compression),
+      randomize_input=shuffle,
+      num_epochs=num_epochs,
+      queue_capacity=queue_capacity,
+      feature_queue_capacity=feature_queue_capacity,
+      reader_num_threads=reader_num_threads,
+      num_enqueue_threads=parser_num_threads,
+      read_batch_size=read_batch_size)
+  if label is None:
+    return batch
+  labels = batch.pop(label)
+  return batch, labels
+
+
+def _batch_size(tensor):
+  if isinstance(tensor, tf.SparseTensor):
+    return tensor.dense_shape[0]
+  return tf.shape(tensor)[0]
+
+
+def measure_throughput(input_fn, num_batches=100, warmup_batches=10):
+  """Measures how fast an `input_fn` delivers examples.
+
+  The batches are read in a graph of their own without a model, so the
+  result is the most the input pipeline can feed to training.
+
+  Args:
+    input_fn: A zero-argument function returning features, or a
+      `(features, labels)` pair.
+    num_batches: The number of batches to time.
+    warmup_batches: The number of batches read before timing starts, while
+      the queues fill up.
+  Returns:
+    The number of examples per second.
+  """
+  with tf.Graph().as_default():
+    tensors = input_fn()
+    features = tensors[0] if isinstance(tensors, tuple) else tensors
+    num_examples = _batch_size(next(iter(features.values())))
+    with tf.Session() as session:
+      session.run([tf.global_variables_initializer(),
+                   tf.local_variables_initializer()])
+      coord = tf.train.Coordinator()
+      threads = tf.train.start_queue_runners(sess=session, coord=coord)
+      try:
+        for _ in range(warmup_batches):
+          session.run([tensors, num_examples])
+        total = 0
+        start = time.time()
+        for _ in range(num_batches):
+          total += session.run([tensors, num_examples])[1]
+        elapsed = time.time() - start
+      finally:
+        coord.request_stop()
+        coord.join(threads)
+  return total / elapsed
+
+
+def _is_integer(values):
+  return np.asarray(values).dtype.kind in "biu"
+
+
+def features_to_types_dict(dataframe, numerical_columns, categorical_columns,
+                           label=None):
+  """Returns the parse spec of the examples `write_tfrecords` writes.
+
+  Numerical features are float32 `FixedLenFeature`s of shape [1], as the
+  `real_valued_column`s expect.  Categorical features are `VarLenFeature`s,
+  so they parse to the SparseTensors the sparse columns expect: strings, or
+  int64 for integer ids such as those from `vocabularies.encode_categorical`.
+  The label keeps integer or float type.
+
+  Args:
+    dataframe: The DataFrame, used for the types of the columns.
+    numerical_columns: The names of the numerical features.
+    categorical_columns: The names of the categorical features.
+    label: The name of the label column, or None.
+  Returns:
+    A dictionary for `tf.parse_example` or `read_batch_features`.
+  """
+  spec = dict((k, tf.FixedLenFeature(shape=[1], dtype=tf.float32))
+              for k in numerical_columns)
+  for k in categorical_columns:
+    spec[k] = tf.VarLenFeature(
+        dtype=tf.int64 if _is_integer(dataframe[k]) else tf.string)
+  if label is not None:
+    spec[label] = tf.FixedLenFeature(
+        shape=[1], dtype=tf.int64 if _is_integer(dataframe[label])
+        else tf.float32)
+  return spec
+
+
+def _column_arrays(dataframe, numerical_columns, categorical_columns, label):
+  """Returns `(name, kind, values, missing)` for every exported column.
+
+  The values stay NumPy arrays; `_example` converts one row at a time, so a
+  chunk never exists as Python objects all at once.
+  """
+  columns = []
+  for k in numerical_columns:
+    columns.append((k, "float", np.asarray(dataframe[k], dtype=np.float32),
+                    None))
+  for k in categorical_columns:
+    series = dataframe[k]
+    if _is_integer(series):
+      columns.append((k, "int64", np.asarray(series, dtype=np.int64), None))
+    else:
+      columns.append((k, "bytes", np.asarray(series, dtype=object),
+                      pd.isnull(series).values))
+  if label is not None:
+    kind = "int64" if _is_integer(dataframe[label]) else "float"
+    columns.append((label, kind, np.asarray(dataframe[label]), None))
+  return columns
+
+
+def _example(columns, row):
+  """Builds the `tf.train.Example` of one row of `_column_arrays`."""
+  feature = {}
+  for name, kind, values, missing in columns:
+    if kind == "float":
+      feature[name] = tf.train.Feature(float_list=tf.train.FloatList(
+          value=[float(values[row])]))
+    elif kind == "int64":
+      feature[name] = tf.train.Feature(int64_list=tf.train.Int64List(
+          value=[int(values[row])]))
+    elif missing[row]:
+      # A missing value has no entry in the SparseTensor.
+      feature[name] = tf.train.Feature(bytes_list=tf.train.BytesList())
+    else:
+      feature[name] = tf.train.Feature(bytes_list=tf.train.BytesList(
+          value=[(u"%s" % values[row]).encode("utf-8")]))
+  return tf.train.Example(features=tf.train.Features(feature=feature))
+
+
+def write_tfrecords(data, output_prefix, numerical_columns,
+                    categorical_columns, label=None, num_shards=1,
+                    compression=None):
+  """Writes a DataFrame as sharded TFRecord files of `tf.train.Example`s.
+
+  Row i goes to shard `i % num_shards`, so every shard holds a spread of the
+  whole data set and the readers of `read_batch_features` can interleave
+  them.  The rows are converted one at a time, and with an iterable of
+  chunks only one chunk is in memory, so the data set does not need to fit
+  in memory:
+
+    tfrecords.write_tfrecords(
+        chunked.iter_shards(output_dir, chunked.TRAINING), "/tmp/census/train",
+        NUMERICAL_COLUMNS, CATEGORICAL_COLUMNS, LABEL, num_shards=8)
+
+  Args:
+    data: The Pandas DataFrame to export, or an iterable of DataFrame chunks
+      such as `chunked.iter_chunks` or `chunked.iter_shards`.
+    output_prefix: The path prefix of the files, e.g. "/tmp/census/train"
+      for "/tmp/census/train-00000-of-00008.tfrecord", ...
+    numerical_columns: The names of the numerical features.
+    categorical_columns: The names of the categorical features.
+    label: The name of the label column, or None.
+    num_shards: The number of files to write.
+    compression: None, or "GZIP" or "ZLIB" to compress the files.
+  Returns:
+    A `(paths, features_to_types_dict)` pair: the list of written files and
+    the parse spec to read them with, which is derived from the first chunk.
+  """
+  if isinstance(data, pd.DataFrame):
+    data = [data]
+  directory = os.path.dirname(os.path.abspath(output_prefix))
+  if not os.path.isdir(directory):
+    os.makedirs(directory)
+  paths = ["%s-%05d-of-%05d.tfrecord" % (output_prefix, shard, num_shards)
+           for shard in range(num_shards)]
+  options = tf.python_io.TFRecordOptions(_compression_type(compression))
+  writers = [tf.python_io.TFRecordWriter(path, options=options)
+             for path in paths]
+  spec = None
+  position = 0
+  try:
+    for chunk in data:
+      if spec is None:
+        spec = features_to_types_dict(chunk, numerical_columns,
+                                      categorical_columns, label)
+      columns = _column_arrays(chunk, numerical_columns, categorical_columns,
+                               label)
+      for row in range(len(chunk)):
+        writers[position % num_shards].write(
+            _example(columns, row).SerializeToString())
+        position += 1
+  finally:
+    for writer in writers:
+      writer.close()
+  return paths, spec
+
+
+def tokenize_terms(input_path, output_path, vocabulary, feature="terms",
+                   compression=None):
+  """Rewrites TFRecords with the string terms replaced by int64 ids.
+
+  Every other feature is copied unchanged.  The vocabulary and its OOV
+  policy are saved next to the output as `<output_path>.terms.json`, so the
+  ids can always be traced back to the terms.
+
+  Args:
+    input_path: A TFRecord file such as lab 12's /tmp/train.tfrecord.
+    output_path: The TFRecord file to write.
+    vocabulary: A `vocabularies.TermVocabulary`.
+    feature: The name of the terms feature.
+    compression: None, or "GZIP" or "ZLIB" to compress the output.  The
+      input is read uncompressed.
+  Returns:
+    A dictionary with the number of examples, of terms read and of terms
+    that were out of the vocabulary.
+  """
+  stats = {"examples": 0, "terms": 0, "oov_terms": 0}
+  options = tf.python_io.TFRecordOptions(_compression_type(compression))
+  with tf.python_io.TFRecordWriter(output_path, options=options) as writer:
+    for record in tf.python_io.tf_record_iterator(input_path):
+      example = tf.train.Example.FromString(record)
+      terms = example.features.feature[feature].bytes_list.value
+      ids = vocabulary.ids(terms)
+      stats["examples"] += 1
+      stats["terms"] += len(terms)
+      stats["oov_terms"] += sum(
+          1 for term_id in ids if term_id >= len(vocabulary.terms)) + (
+              len(terms) - len(ids))
+      example.features.feature[feature].Clear()
+      example.features.feature[feature].int64_list.value.extend(ids)
+      writer.write(example.SerializeToString())
+  vocabulary.save(output_path + ".terms.json")
+  return stats
+
+
+def term_id_features_to_types_dict(feature="terms", label="labels"):
+  """Returns lab 12's parse spec for files written by `tokenize_terms`."""
+  return {feature: tf.VarLenFeature(dtype=tf.int64),
+          label: tf.FixedLenFeature(shape=[1], dtype=tf.float32)}
+
+
+def _feature_values(feature, dtype):
+  if dtype == tf.string:
+    return feature.bytes_list.value
+  if dtype == tf.int64:
+    return feature.int64_list.value
+  return feature.float_list.value
+
+
+def _numpy_dtype(dtype):
+  if dtype == tf.string:
+    return np.object_
+  return dtype.as_numpy_dtype
+
+
+def _source_signature(paths, features):
+  """Identifies the decoded arrays of `paths` parsed with `features`."""
+  specs = []
+  for name in sorted(features):
+    spec = features[name]
+    specs.append([name, type(spec).__name__, spec.dtype.name,
+                  list(getattr(spec, "shape", None) or []),
+                  repr(getattr(spec, "default_value", None))])
+  return {"files": [[path, os.path.getsize(path), os.path.getmtime(path)]
+                    for path in paths],
+          "features": specs}
+
+
+class DecodedExampleCache(object):
+  """Keeps the decoded examples of TFRecord files in memory.
+
+  Lab 12's `train_model` reads and parses /tmp/train.tfrecord again in
+  every `fit` period and every `evaluate` call.  The first `input_fn` call
+  of a cache decodes the files once into NumPy arrays: a dense array per
+  `FixedLenFeature`, and the flat values plus row offsets per
+  `VarLenFeature`.  Every later call, from any graph, builds its batches
+  from those arrays without any file I/O or protobuf parsing.  With a
+  `cache_file` the arrays are also spilled to disk, so later processes skip
+  the parsing too as long as the TFRecord files and the parse spec are
+  unchanged:
+
+    train_cache = tfrecords.DecodedExampleCache(
+        "/tmp/train.tfrecord", features_to_types_dict,
+        cache_file="/tmp/train.cache.npz")
+    model.fit(input_fn=train_cache.input_fn(), steps=steps_per_period)
+    print(train_cache.hits, train_cache.file_hits, train_cache.misses)
+
+  `hits` counts the `input_fn` calls served from memory, `file_hits` the
+  loads from the cache file and `misses` the decodings of the TFRecords.
+  """
+
+  def __init__(self, file_pattern, features, cache_file=None,
+               compression=None):
+    """Creates an empty cache.
+
+    Args:
+      file_pattern: A glob pattern or list of TFRecord files.
+      features: The parse spec, with `FixedLenFeature`s and
+        `VarLenFeature`s.
+      cache_file: A .npz file to spill the decoded arrays to, or None to
+        keep them in memory only.
+      compression: None, or "GZIP" or "ZLIB" for compressed files.
+    """
+    self.file_pattern = file_pattern
+    self.features = features
+    self.cache_file = cache_file
+    self.compression = compression
+    self.hits = 0
+    self.file_hits = 0
+    self.misses = 0
+    self._arrays = None
+
+  def _paths(self):
+    patterns = self.file_pattern
+    if isinstance(patterns, str):
+      patterns = [patterns]
+    return sorted(path for pattern in patterns
+                  for path in tf.gfile.Glob(pattern))
+
+  def _decode(self, paths):
+    columns = dict((name, []) for name in self.features)
+    options = tf.python_io.TFRecordOptions(
+        _compression_type(self.compression))
+    for path in paths:
+      for record in tf.python_io.tf_record_iterator(path, options=options):
+        feature_map = tf.train.Example.FromString(record).features.feature
+        for name, spec in self.features.items():
+          values = list(_feature_values(feature_map[name], spec.dtype))
+          if isinstance(spec, tf.FixedLenFeature) and not values:
+            if spec.default_value is None:
+              raise ValueError("Feature %s is missing from a record of %s" %
+                               (name, path))
+            values = np.broadcast_to(spec.default_value, spec.shape).ravel()
+          columns[name].append(values)
+    arrays = {}
+    for name, spec in self.features.items():
+      dtype = _numpy_dtype(spec.dtype)
+      if isinstance(spec, tf.FixedLenFeature):
+        arrays[name + "/dense"] = np.asarray(
+            columns[name], dtype=dtype).reshape([-1] + list(spec.shape))
+      else:
+        lengths = np.fromiter((len(v) for v in columns[name]), np.int64,
+                              len(columns[name]))
+        arrays[name + "/splits"] = np.concatenate(
+            [[0], np.cumsum(lengths)]).astype(np.int64)
+        flat = [value for values in columns[name] for value in values]
+        arrays[name + "/values"] = np.asarray(flat, dtype=dtype)
+    return arrays
+
+  def _load_cache_file(self, signature):
+    if self.cache_file is None or not os.path.isfile(self.cache_file):
+      return None
+    with np.load(self.cache_file) as cached:
+      if json.loads(str(cached["__source__"])) != signature:
+        return None
+      return dict((k, cached[k]) for k in cached.files if k != "__source__")
+
+  def _save_cache_file(self, arrays, signature):
+    directory = os.path.dirname(os.path.abspath(self.cache_file))
+    handle, staging = tempfile.mkstemp(dir=directory, prefix=".cache-",
+                                       suffix=".npz")
+    with os.fdopen(handle, "wb") as f:
+      # String values are stored as fixed width bytes so no pickling is
+      # needed to read them back.
+      np.savez(f, __source__=np.array(json.dumps(signature)), **dict(
+          (k, v.astype(np.bytes_) if v.dtype == np.object_ else v)
+          for k, v in arrays.items()))
+    os.rename(staging, self.cache_file)
+
+  def arrays(self):
+    """Returns the decoded arrays, decoding the files on the first call."""
+    if self._arrays is not None:
+      self.hits += 1
+      return self._arrays
+    paths = self._paths()
+    signature = _source_signature(paths, self.features)
+    arrays = self._load_cache_file(signature)
+    if arrays is not None:
+      self.file_hits += 1
+    else:
+      self.misses += 1
+      arrays = self._decode(paths)
+      if self.cache_file is not None:
+        self._save_cache_file(arrays, signature)
+    self._arrays = arrays
+    return arrays
+
+  def _num_examples(self, arrays):
+    name, spec = next(iter(self.features.items()))
+    if isinstance(spec, tf.FixedLenFeature):
+      return len(arrays[name + "/dense"])
+    return len(arrays[name + "/splits"]) - 1
+
+  def _batch(self, arrays, rows):
+    """Gathers the given rows into a flat dictionary of NumPy arrays."""
+    batch = {}
+    for name, spec in self.features.items():
+      if isinstance(spec, tf.FixedLenFeature):
+        batch[name] = arrays[name + "/dense"][rows]
+        continue
+      splits = arrays[name + "/splits"]
+      starts = splits[rows]
+      lengths = splits[rows + 1] - starts
+      row_ids = np.repeat(np.arange(len(rows), dtype=np.int64), lengths)
+      columns = (np.arange(lengths.sum(), dtype=np.int64) -
+                 np.repeat(np.cumsum(lengths) - lengths, lengths))
+      batch[name + "/indices"] = np.stack([row_ids, columns], axis=1)
+      batch[name + "/values"] = arrays[name + "/values"][
+          np.repeat(starts, lengths) + columns]
+      batch[name + "/dense_shape"] = np.array(
+          [len(rows), lengths.max() if len(rows) else 0], dtype=np.int64)
+    return batch
+
+  def input_fn(self, label="labels", batch_size=DEFAULT_BATCH_SIZE,
+               shuffle=True, num_epochs=None, seed=None):
+    """Returns an `input_fn` that reads batches from the cache.
+
+    Args:
+      label: The name of the label feature, or None to return only features.
+      batch_size: The number of examples per batch.
+      shuffle: Whether to shuffle all the examples every epoch.
+      num_epochs: The number of passes over the examples, or None to repeat
+        forever.
+      seed: The random seed for shuffling.  Every call of the `input_fn`
+        uses the next seed (seed, seed + 1, ...), so the `fit` calls of a
+        period loop do not all replay the same order.
+    Returns:
+      A zero-argument `input_fn` returning `(features, labels)`, or only the
+      features if `label` is None.
+    """
+    calls = [0]
+
+    def generate():
+      arrays = self.arrays()
+      num_examples = self._num_examples(arrays)
+      random_state = np.random.RandomState(
+          None if seed is None else seed + calls[0])
+      calls[0] += 1
+      epoch = 0
+      while num_epochs is None or epoch < num_epochs:
+        order = np.arange(num_examples)
+        if shuffle:
+          random_state.shuffle(order)
+        for start in range(0, num_examples, batch_size):
+          yield self._batch(arrays, order[start:start + batch_size])
+        epoch += 1
+
+    output_types = {}
+    output_shapes = {}
+    for name, spec in self.features.items():
+      if isinstance(spec, tf.FixedLenFeature):
+        output_types[name] = spec.dtype
+        output_shapes[name] = tf.TensorShape([None] + list(spec.shape))
+      else:
+        output_types.update({name + "/indices": tf.int64,
+                             name + "/values": spec.dtype,
+                             name + "/dense_shape": tf.int64})
+        output_shapes.update({name + "/indices": tf.TensorShape([None, 2]),
+                              name + "/values": tf.TensorShape([None]),
+                              name + "/dense_shape": tf.TensorShape([2])})
+
+    def cached_input_fn():
+      dataset = tf.data.Dataset.from_generator(generate, output_types,
+                                               output_shapes)
+      batch = dataset.prefetch(1).make_one_shot_iterator().get_next()
+      features = {}
+      for name, spec in self.features.items():
+        if isinstance(spec, tf.FixedLenFeature):
+          features[name] = batch[name]
+        else:
+          features[name] = tf.SparseTensor(
+              indices=batch[name + "/indices"],
+              values=batch[name + "/values"],
+              dense_shape=batch[name + "/dense_shape"])
+      if label is None:
+        return features
+      labels = features.pop(label)
+      return features, labels
+
+    return cached_input_fn
@@ -0,0 +1,320 @@
+"""Training drivers that keep one graph and session for a whole run.
+
+The labs' `train_model` calls `model.fit(..., steps=steps_per_period)` once
+per period and `model.evaluate` once per data set and period.  Every one of
+those calls builds a new graph, starts a new session, restores the
+checkpoint from `model_dir` and, for `fit`, writes it back, which for the
+small lab models costs more than the training itself.
+`train_with_periodic_evaluation` builds the training graph and one
+evaluation graph per data set once, sharing the model's variables, and runs
+all periods in a single session.  The evaluations run from a hook:
+
+  results = training.train_with_periodic_evaluation(
+      model,
+      lambda: _input_fn("/tmp/train.tfrecord"),
+      {"training": lambda: _input_fn("/tmp/train.tfrecord"),
+       "validation": lambda: _input_fn("/tmp/test.tfrecord")},
+      steps=STEPS)
+  training_losses = [metrics["loss"] for metrics in results["training"]]
+  validation_losses = [metrics["loss"] for metrics in results["validation"]]
+
+The checkpoint is written to the model's `model_dir` at the end, so the
+estimator's `evaluate` and `predict` methods see the trained model.
+
+`train_with_early_stopping` keeps the labs' fit-per-period loop but stops
+once the validation loss stops improving, and restores the checkpoint with
+the lowest validation loss:
+
+  result = training.train_with_early_stopping(
+      model, train_input_fn,
+      lambda model: compute_loss(model, eval_input_fn,
+                                 validation_examples[LABEL]),
+      steps=STEPS, patience=2, min_delta=0.001)
+  print("Stopped after %d steps, saving %d" % (result.steps_trained,
+                                               result.steps_saved))
+
+`regularization_path` trains one model per regularization strength, each
+starting from the previous one's checkpoint, for lab 10's trade-off between
+AUC and model size.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+import glob
+import os
+import shutil
+
+import tensorflow as tf
+
+import sweeps
+
+
+def _split_input(tensors):
+  if isinstance(tensors, tuple):
+    return tensors
+  return tensors, None
+
+
+class PeriodicEvaluationHook(tf.train.SessionRunHook):
+  """Evaluates data sets every `every_n_steps` training steps.
+
+  Each evaluation resets the local metric variables of its data set, runs
+  their update ops for `evaluation_steps` batches and records the metric
+  values, the same metrics `evaluate` returns.
+  """
+
+  def __init__(self, evaluations, every_n_steps, evaluation_steps=1):
+    """Creates the hook.
+
+    Args:
+      evaluations: An ordered dictionary mapping each data set name to a
+        `(metric_ops, reset_op)` pair, where `metric_ops` maps metric names
+        to `(value, update)` pairs.
+      every_n_steps: The number of training steps between evaluations.
+      evaluation_steps: The number of batches per evaluation.
+    """
+    self.evaluations = evaluations
+    self.every_n_steps = every_n_steps
+    self.evaluation_steps = evaluation_steps
+    self.results = collections.OrderedDict(
+        (name, []) for name in evaluations)
+    self._steps = 0
+
+  def after_run(self, run_context, run_values):
+    self._steps += 1
+    if self._steps % self.every_n_steps == 0:
+      self.evaluate(run_context.session)
+
+  def evaluate(self, session):
+    for name, (metric_ops, reset_op) in self.evaluations.items():
+      session.run(reset_op)
+      updates = dict((k, update) for k, (_, update) in metric_ops.items())
+      for _ in range(self.evaluation_steps):
+        session.run(updates)
+      values = dict((k, value) for k, (value, _) in metric_ops.items())
+      self.results[name].append(session.run(values))
+
+
+def train_with_periodic_evaluation(model, train_input_fn, evaluation_input_fns,
+                                   steps, periods=10, evaluation_steps=1):
+  """Trains a contrib.learn estimator in one session, evaluating periodically.
+
+  This uses the estimator's `_get_train_ops` and `_get_eval_ops`, the
+  methods `fit` and `evaluate` build their graphs with, so the model is the
+  same; the evaluation graphs reuse the training graph's variables.
+
+  Args:
+    model: A `tf.contrib.learn` estimator, e.g. a `LinearClassifier`.
+    train_input_fn: The `input_fn` for training.
+    evaluation_input_fns: A dictionary mapping data set names to the
+      `input_fn`s to evaluate after each period.
+    steps: The total number of training steps.
+    periods: The number of periods, i.e. of evaluations of each data set.
+    evaluation_steps: The number of batches per evaluation, as the `steps`
+      of `evaluate`.
+  Returns:
+    An ordered dictionary mapping each data set name to the list of metric
+    dictionaries of its evaluations, one per period.
+  """
+  steps_per_period = max(steps // periods, 1)
+  with tf.Graph().as_default():
+    if model.config.tf_random_seed is not None:
+      tf.set_random_seed(model.config.tf_random_seed)
+    global_step = tf.contrib.framework.get_or_create_global_step()
+    features, labels = _split_input(train_input_fn())
+    train_ops = model._get_train_ops(features, labels)  # pylint: disable=protected-access
+
+    # The evaluation graphs add summaries of their own, e.g. of the loss.
+    # Those must stay out of the summary op the session runs with the train
+    # op, or every summary step would also read a batch from every
+    # evaluation input, stopping training once a one-pass input runs out.
+    train_summaries = list(tf.get_collection(tf.GraphKeys.SUMMARIES))
+    evaluations = collections.OrderedDict()
+    for name in sorted(evaluation_input_fns):
+      local_variables = set(tf.local_variables())
+      with tf.variable_scope(tf.get_variable_scope(), reuse=True), \
+          tf.name_scope(name):
+        features, labels = _split_input(evaluation_input_fns[name]())
+        eval_ops = model._get_eval_ops(features, labels, None)  # pylint: disable=protected-access
+      metric_variables = [v for v in tf.local_variables()
+                          if v not in local_variables]
+      evaluations[name] = (eval_ops.eval_metric_ops,
+                           tf.variables_initializer(metric_variables))
+
+    summaries = tf.get_collection_ref(tf.GraphKeys.SUMMARIES)
+    del summaries[:]
+    summaries.extend(train_summaries)
+
+    evaluation_hook = PeriodicEvaluationHook(evaluations, steps_per_period,
+                                             evaluation_steps)
+    hooks = [tf.train.StopAtStepHook(num_steps=steps_per_period * periods),
+             evaluation_hook]
+    hooks.extend(train_ops.training_hooks or [])
+    with tf.train.MonitoredTrainingSession(
+        checkpoint_dir=model.model_dir,
+        scaffold=train_ops.scaffold,
+        hooks=hooks,
+        config=model.config.tf_config) as session:
+      while not session.should_stop():
+        session.run([train_ops.train_op, global_step])
+  return evaluation_hook.results
+
+
+class EarlyStopping(object):
+  """Tracks a validation loss and decides when training should stop.
+
+  A loss counts as an improvement when it is lower than the best loss so far
+  by more than `min_delta`.  Training should stop after `patience`
+  evaluations in a row without an improvement.
+  """
+
+  def __init__(self, patience=2, min_delta=0.0):
+    self.patience = patience
+    self.min_delta = min_delta
+    self.best_loss = float("inf")
+    self.best_period = None
+    self.periods_without_improvement = 0
+
+  def update(self, loss, period):
+    """Records the loss of a period and returns whether it is the best."""
+    if loss < self.best_loss - self.min_delta:
+      self.best_loss = loss
+      self.best_period = period
+      self.periods_without_improvement = 0
+      return True
+    self.periods_without_improvement += 1
+    return False
+
+  @property
+  def should_stop(self):
+    return self.periods_without_improvement >= self.patience
+
+
+EarlyStoppingResult = collections.namedtuple(
+    "EarlyStoppingResult",
+    ["validation_losses", "best_period", "best_loss", "best_checkpoint",
+     "steps_trained", "steps_saved"])
+
+
+def _copy_checkpoint(checkpoint_path, directory):
+  """Copies the files of a checkpoint, returning the path of the copy."""
+  if os.path.isdir(directory):
+    shutil.rmtree(directory)
+  os.makedirs(directory)
+  for path in glob.glob(checkpoint_path + ".*"):
+    shutil.copy(path, directory)
+  return os.path.join(directory, os.path.basename(checkpoint_path))
+
+
+def train_with_early_stopping(model, train_input_fn, validation_loss_fn, steps,
+                              periods=10, patience=2, min_delta=0.0):
+  """Trains period by period until the validation loss stops improving.
+
+  After each period in which the validation loss improves, its checkpoint is
+  copied to `<model_dir>/best`, so `keep_checkpoint_max` cannot delete it.
+  When training stops, that copy becomes the model's latest checkpoint, and
+  `evaluate` and `predict` use the best model.
+
+  Args:
+    model: A `tf.contrib.learn` estimator.
+    train_input_fn: The `input_fn` for training.
+    validation_loss_fn: A function taking the model and returning its
+      validation loss, e.g. a wrapper around the labs' `compute_loss`.
+    steps: The maximum total number of training steps.
+    periods: The number of periods the steps are divided into.
+    patience: The number of periods without improvement to stop after.
+    min_delta: The smallest decrease of the loss that counts as an
+      improvement.
+  Returns:
+    An `EarlyStoppingResult` with the validation loss of every period run,
+    the best period, its loss and checkpoint, and the number of steps
+    trained and saved.
+  """
+  steps_per_period = max(steps // periods, 1)
+  early_stopping = EarlyStopping(patience, min_delta)
+  best_directory = os.path.join(os.path.abspath(model.model_dir), "best")
+  best_checkpoint = None
+  validation_losses = []
+  for period in range(periods):
+    model.fit(input_fn=train_input_fn, steps=steps_per_period)
+    loss = validation_loss_fn(model)
+    validation_losses.append(loss)
+    if early_stopping.update(loss, period):
+      best_checkpoint = _copy_checkpoint(
+          tf.train.latest_checkpoint(model.model_dir), best_directory)
+    if early_stopping.should_stop:
+      break
+  if best_checkpoint is not None:
+    tf.train.update_checkpoint_state(model.model_dir, best_checkpoint)
+  steps_trained = steps_per_period * len(validation_losses)
+  return EarlyStoppingResult(
+      validation_losses, early_stopping.best_period, early_stopping.best_loss,
+      best_checkpoint, steps_trained, steps_per_period * periods - steps_trained)
+
+
+def warm_start(model, checkpoint_path):
+  """Makes a copy of another model's checkpoint the latest one of `model`.
+
+  The next `fit` then starts from those weights (and optimizer state)
+  instead of initializing them.  The models must have the same variables.
+  """
+  copy = _copy_checkpoint(
+      checkpoint_path,
+      os.path.join(os.path.abspath(model.model_dir), "warm_start"))
+  tf.train.update_checkpoint_state(model.model_dir, copy)
+
+
+RegularizationPathPoint = collections.namedtuple(
+    "RegularizationPathPoint",
+    ["strength", "model_size", "metrics", "steps", "model"])
+
+
+def regularization_path(define_model, strengths, train_input_fn,
+                        evaluate_fn, initial_steps, steps_per_strength):
+  """Trains warm-started models along a sequence of regularization strengths.
+
+  Lab 10 trains a new `LinearClassifier` from scratch for every
+  `l1_regularization_strength`, but the solutions for neighbouring
+  strengths are close.  Here only the first model is trained for
+  `initial_steps`.  Every later model starts from the checkpoint of the
+  previous one and trains `steps_per_strength` more steps, usually a small
+  fraction:
+
+    path = training.regularization_path(
+        lambda l1: define_linear_classifier(
+            LEARNING_RATE, l1_regularization_strength=l1,
+            l2_regularization_strength=L2_REGULARIZATION_STRENGTH),
+        [2.0, 1.0, 0.5, 0.25, 0.1, 0.0], train_input_fn,
+        lambda model: model.evaluate(input_fn=eval_input_fn, steps=1),
+        initial_steps=STEPS, steps_per_strength=STEPS // 5)
+    plt.plot([p.model_size for p in path], [p.metrics["auc"] for p in path])
+
+  Args:
+    define_model: A function taking a strength and returning a new estimator
+      that uses it.  Every model must have the same variables.
+    strengths: The strengths in the order to train them, from high to low
+      or from low to high.
+    train_input_fn: The `input_fn` for training.
+    evaluate_fn: A function taking a trained model and returning a
+      dictionary of metrics, such as `evaluate` on the validation data.
+    initial_steps: The number of steps to train the first model.
+    steps_per_strength: The number of steps to train each later model.
+  Returns:
+    A list of `RegularizationPathPoint`s in the order of `strengths`, with
+    each strength's model size (its non-zero weights), metrics, steps
+    trained and model.
+  """
+  path = []
+  checkpoint_path = None
+  for strength in strengths:
+    model = define_model(strength)
+    steps = initial_steps
+    if checkpoint_path is not None:
+      warm_start(model, checkpoint_path)
+      steps = steps_per_strength
+    model.fit(input_fn=train_input_fn, steps=steps)
+    checkpoint_path = tf.train.latest_checkpoint(model.model_dir)
+    path.append(RegularizationPathPoint(strength, sweeps.model_size(model),
+                                        evaluate_fn(model), steps, model))
+  return path
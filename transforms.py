@@ -0,0 +1,465 @@
+"""Vectorized feature transforms for `prepare_features`.
+
+The labs scale features with `series.apply(lambda x: ...)`, which makes one
+Python call per row, e.g.
+
+  def linear_scale(series):
+    min_val = series.min()
+    max_val = series.max()
+    scale = 1.0 * (max_val - min_val)
+    return series.apply(lambda x:((x - min_val) / scale))
+
+The functions here compute the same transforms with NumPy ufuncs over the
+whole column at once.  Each accepts a Pandas Series or a NumPy array and
+returns the same kind of object.  Passing `out` writes the result into an
+existing float array instead of allocating a new one; passing the input array
+itself as `out` transforms it in place.
+
+`benchmarks/transforms_benchmark.py` compares these with the `apply` versions.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import numpy as np
+import pandas as pd
+
+
+def _values(values):
+  """Returns the NumPy array behind a Series or array-like."""
+  if isinstance(values, pd.Series):
+    return values.values
+  return np.asarray(values)
+
+
+def _float_values(values):
+  """Like `_values`, but converts integer columns to float64."""
+  x = _values(values)
+  if x.dtype.kind != "f":
+    x = x.astype(np.float64)
+  return x
+
+
+def _like(result, values):
+  """Wraps `result` in a Series if `values` was a Series."""
+  if isinstance(values, pd.Series):
+    return pd.Series(result, index=values.index, name=values.name)
+  return result
+
+
+def _nonzero(scale):
+  # A constant column has no spread to divide by; map it to 0 rather than
+  # filling it with NaN or inf.
+  return scale if scale != 0 else 1.0
+
+
+def linear_scale(values, min_val=None, max_val=None, out=None):
+  """Linearly rescales values to the range [0, 1].
+
+  Args:
+    values: A Series or array of numbers.
+    min_val: The value to map to 0, or None to use the minimum of `values`.
+    max_val: The value to map to 1, or None to use the maximum of `values`.
+    out: An optional float array to write the result into.
+  Returns:
+    The scaled values.
+  """
+  x = _float_values(values)
+  if min_val is None:
+    min_val = np.nanmin(x)
+  if max_val is None:
+    max_val = np.nanmax(x)
+  scale = _nonzero(1.0 * (max_val - min_val))
+  result = np.subtract(x, min_val, out=out)
+  result /= scale
+  return _like(result, values)
+
+
+def log_scale(values, out=None):
+  """Computes log(x + 1) of every value.
+
+  Args:
+    values: A Series or array of numbers greater than -1.
+    out: An optional float array to write the result into.
+  Returns:
+    The log scaled values.
+  """
+  return _like(np.log1p(_values(values), out=out), values)
+
+
+def clip(values, clip_to_min, clip_to_max, out=None):
+  """Clips values to [clip_to_min, clip_to_max].
+
+  Args:
+    values: A Series or array of numbers.
+    clip_to_min: The lower bound, e.g. `-np.inf` for none.
+    clip_to_max: The upper bound, e.g. `np.inf` for none.
+    out: An optional array to write the result into.
+  Returns:
+    The clipped values.
+  """
+  return _like(np.clip(_values(values), clip_to_min, clip_to_max, out=out),
+               values)
+
+
+def z_score(values, mean=None, std=None, out=None):
+  """Standardizes values to zero mean and unit standard deviation.
+
+  Args:
+    values: A Series or array of numbers.
+    mean: The mean to subtract, or None to use the mean of `values`.
+    std: The standard deviation to divide by, or None to use the standard
+      deviation of `values`.
+    out: An optional float array to write the result into.
+  Returns:
+    The standardized values.
+  """
+  x = _float_values(values)
+  if mean is None:
+    mean = np.nanmean(x)
+  if std is None:
+    std = np.nanstd(x)
+  result = np.subtract(x, mean, out=out)
+  result /= _nonzero(std)
+  return _like(result, values)
+
+
+def robust_scale(values, median=None, iqr=None, out=None):
+  """Centers values on the median and divides by the interquartile range.
+
+  Unlike `linear_scale` and `z_score`, the result is not dominated by a few
+  extreme values such as the large `capital_gain` entries in the census data.
+
+  Args:
+    values: A Series or array of numbers.
+    median: The center, or None to use the median of `values`.
+    iqr: The spread, or None to use the 75th minus the 25th percentile of
+      `values`.
+    out: An optional float array to write the result into.
+  Returns:
+    The scaled values.
+  """
+  x = _float_values(values)
+  if median is None or iqr is None:
+    q25, q50, q75 = np.nanpercentile(x, [25, 50, 75])
+    if median is None:
+      median = q50
+    if iqr is None:
+      iqr = q75 - q25
+  result = np.subtract(x, median, out=out)
+  result /= _nonzero(iqr)
+  return _like(result, values)
+
+
+class LinearScaler(object):
+  """`linear_scale` with statistics fit once and reused for every batch.
+
+  Calling `linear_scale` on the training, validation and test sets scales
+  each with its own minimum and maximum.  A scaler is fit on the training
+  data only, can be saved with `save_scalers`, and then applies exactly the
+  training transform to any later batch without rescanning the training set:
+
+    scaler = LinearScaler().fit(training_df["age"])
+    validation_df["age"] = scaler.transform(validation_df["age"])
+  """
+
+  kind = "linear"
+
+  def __init__(self, min_val=None, max_val=None):
+    self.min_val = min_val
+    self.max_val = max_val
+
+  def _prepare(self, values, out=None):
+    """Applies the steps that come before the linear scaling."""
+    return values
+
+  def partial_fit(self, values):
+    """Updates the statistics with another chunk of training data.
+
+    Args:
+      values: A Series or array of numbers.
+    Returns:
+      This scaler.
+    """
+    x = self._prepare(_float_values(values))
+    if len(x):
+      min_val, max_val = float(np.nanmin(x)), float(np.nanmax(x))
+      self.min_val = (min_val if self.min_val is None
+                      else min(self.min_val, min_val))
+      self.max_val = (max_val if self.max_val is None
+                      else max(self.max_val, max_val))
+    return self
+
+  def fit(self, values):
+    """Fits the statistics to `values`, discarding any earlier fit.
+
+    Args:
+      values: A Series or array of numbers.
+    Returns:
+      This scaler.
+    """
+    self.min_val = None
+    self.max_val = None
+    return self.partial_fit(values)
+
+  def transform(self, values, out=None):
+    """Scales `values` with the fitted statistics in a single pass.
+
+    Args:
+      values: A Series or array of numbers.
+      out: An optional float array to write the result into.
+    Returns:
+      The scaled values.
+    Raises:
+      ValueError: If the scaler has not been fit.
+    """
+    if self.min_val is None or self.max_val is None:
+      raise ValueError("%s has not been fit" % type(self).__name__)
+    x = _float_values(values)
+    if out is None:
+      out = np.empty_like(x)
+    # The steps before the linear scaling write into `out`, which the linear
+    # scaling then updates in place, so no intermediate array is allocated.
+    x = self._prepare(x, out)
+    return _like(linear_scale(x, self.min_val, self.max_val, out=out), values)
+
+  def get_config(self):
+    """Returns the JSON-serializable description of this scaler."""
+    return {"kind": self.kind, "min_val": self.min_val,
+            "max_val": self.max_val}
+
+
+class LogLinearScaler(LinearScaler):
+  """`log_scale` followed by `linear_scale`, fit on the log scaled values."""
+
+  kind = "log_linear"
+
+  def _prepare(self, values, out=None):
+    return np.log1p(values, out=out)
+
+
+class ClippedLinearScaler(LinearScaler):
+  """`clip` followed by `linear_scale`, fit on the clipped values."""
+
+  kind = "clipped_linear"
+
+  def __init__(self, clip_to_min=-np.inf, clip_to_max=np.inf, min_val=None,
+               max_val=None):
+    super(ClippedLinearScaler, self).__init__(min_val, max_val)
+    self.clip_to_min = clip_to_min
+    self.clip_to_max = clip_to_max
+
+  def _prepare(self, values, out=None):
+    return np.clip(values, self.clip_to_min, self.clip_to_max, out=out)
+
+  def get_config(self):
+    config = super(ClippedLinearScaler, self).get_config()
+    config["clip_to_min"] = self.clip_to_min
+    config["clip_to_max"] = self.clip_to_max
+    return config
+
+
+_SCALER_CLASSES = dict((cls.kind, cls) for cls in (
+    LinearScaler, LogLinearScaler, ClippedLinearScaler))
+
+
+def scaler_from_config(config):
+  """Creates a scaler from the output of its `get_config`."""
+  config = dict(config)
+  kind = config.pop("kind")
+  if kind not in _SCALER_CLASSES:
+    raise ValueError("Unknown scaler kind %r" % kind)
+  return _SCALER_CLASSES[kind](**config)
+
+
+def fit_scalers(dataframe, scalers):
+  """Fits a scaler per feature on the training data.
+
+  Args:
+    dataframe: The training DataFrame.
+    scalers: A dictionary mapping feature names to unfitted scalers.
+  Returns:
+    The same dictionary, with every scaler fit.
+  """
+  for feature, scaler in scalers.items():
+    scaler.fit(dataframe[feature])
+  return scalers
+
+
+def apply_scalers(dataframe, scalers):
+  """Returns a copy of `dataframe` with each feature scaled by its scaler."""
+  processed_features = dataframe.copy()
+  for feature, scaler in scalers.items():
+    processed_features[feature] = scaler.transform(dataframe[feature])
+  return processed_features
+
+
+def save_scalers(scalers, path):
+  """Saves fitted scalers to a small JSON file.
+
+  Args:
+    scalers: A dictionary mapping feature names to fitted scalers.
+    path: The file to write.
+  """
+  # JSON has no infinity, so unbounded clips, of a `ClippedLinearScaler` or
+  # of a "clip" step of a `Pipeline`, are written as null.
+  def encode(value):
+    return (None if isinstance(value, (float, np.floating)) and
+            np.isinf(value) else value)
+
+  configs = {}
+  for feature, scaler in scalers.items():
+    config = scaler.get_config()
+    for key in ("clip_to_min", "clip_to_max"):
+      if key in config:
+        config[key] = encode(config[key])
+    for step in config.get("steps", []):
+      if step[0] == "clip":
+        step[1:] = [encode(value) for value in step[1:]]
+    configs[feature] = config
+  with open(path, "w") as f:
+    json.dump(configs, f, indent=2, sort_keys=True, allow_nan=False)
+
+
+def load_scalers(path):
+  """Loads scalers written by `save_scalers`.
+
+  Args:
+    path: The file to read.
+  Returns:
+    A dictionary mapping feature names to fitted scalers.
+  """
+  with open(path) as f:
+    configs = json.load(f)
+  scalers = {}
+  for feature, config in configs.items():
+    if config.get("clip_to_min", 0) is None:
+      config["clip_to_min"] = -np.inf
+    if config.get("clip_to_max", 0) is None:
+      config["clip_to_max"] = np.inf
+    for step in config.get("steps", []):
+      if step[0] == "clip":
+        if step[1] is None:
+          step[1] = -np.inf
+        if step[2] is None:
+          step[2] = np.inf
+    scalers[feature] = scaler_from_config(config)
+  return scalers
+
+
+DEFAULT_BLOCK_SIZE = 1 << 16
+
+
+class Pipeline(object):
+  """A chain of transforms applied to a feature in one fused pass.
+
+  Chaining the transforms, e.g. `linear_scale(clip(log_scale(x), 0, 10))`,
+  allocates a new column for every step and streams the whole column through
+  memory once per step.  A pipeline instead converts the column to a single
+  float32 buffer and runs every step in place on one cache-sized block at a
+  time, so the data is read and written once however many steps there are:
+
+    pipeline = Pipeline([("clip", 0, 1000), "log1p", "minmax"])
+    pipeline.fit(training_df["total_rooms"])
+    training_df["total_rooms"] = pipeline.transform(training_df["total_rooms"])
+
+  The steps are:
+    ("clip", clip_to_min, clip_to_max): `clip`.
+    "log1p": `log_scale`.
+    "minmax": `linear_scale` to [0, 1].
+    "zscore": `z_score`.
+  "minmax" and "zscore" use statistics learned by `fit` from the values
+  reaching that step, so a pipeline is fit once on training data and then
+  transforms any later batch, like the scalers above.
+  """
+
+  kind = "pipeline"
+  _STATEFUL_STEPS = ("minmax", "zscore")
+
+  def __init__(self, steps, statistics=None, dtype=np.float32):
+    self.steps = [tuple(step) if isinstance(step, (list, tuple)) else (step,)
+                  for step in steps]
+    for step in self.steps:
+      if step[0] not in ("clip", "log1p") + self._STATEFUL_STEPS:
+        raise ValueError("Unknown pipeline step %r" % (step,))
+    self.statistics = statistics
+    self.dtype = np.dtype(dtype)
+
+  @staticmethod
+  def _step_function(step, stats):
+    """Returns a function applying `step` in place to a block."""
+    name = step[0]
+    if name == "clip":
+      return lambda b: np.clip(b, step[1], step[2], out=b)
+    if name == "log1p":
+      return lambda b: np.log1p(b, out=b)
+    if name == "minmax":
+      offset, scale = stats["min_val"], stats["max_val"] - stats["min_val"]
+    else:
+      offset, scale = stats["mean"], stats["std"]
+    factor = 1.0 / _nonzero(scale)
+    return lambda b: np.multiply(np.subtract(b, offset, out=b), factor, out=b)
+
+  def fit(self, values):
+    """Learns the statistics of the "minmax" and "zscore" steps.
+
+    Args:
+      values: A Series or array of training values.
+    Returns:
+      This pipeline.
+    """
+    buffer = np.array(_values(values), dtype=self.dtype)
+    statistics = []
+    for step in self.steps:
+      stats = None
+      if step[0] == "minmax":
+        stats = {"min_val": float(np.nanmin(buffer)),
+                 "max_val": float(np.nanmax(buffer))}
+      elif step[0] == "zscore":
+        stats = {"mean": float(np.nanmean(buffer)),
+                 "std": float(np.nanstd(buffer))}
+      statistics.append(stats)
+      # Each step is fit on the output of the steps before it.
+      self._step_function(step, stats)(buffer)
+    self.statistics = statistics
+    return self
+
+  def transform(self, values, out=None, block_size=DEFAULT_BLOCK_SIZE):
+    """Runs every step over `values` in one fused, blocked pass.
+
+    Args:
+      values: A Series or array of numbers.
+      out: An optional array of the pipeline dtype (float32 by default) and
+        the length of `values` to write the result into.  Passing the input
+        array itself transforms it in place.
+      block_size: The number of values processed through all steps at once.
+    Returns:
+      The transformed values.
+    Raises:
+      ValueError: If the pipeline has stateful steps and has not been fit.
+    """
+    if self.statistics is None:
+      if any(step[0] in self._STATEFUL_STEPS for step in self.steps):
+        raise ValueError("Pipeline has not been fit")
+      self.statistics = [None] * len(self.steps)
+    x = _values(values)
+    if out is None:
+      out = np.empty(x.shape, dtype=self.dtype)
+    functions = [self._step_function(step, stats)
+                 for step, stats in zip(self.steps, self.statistics)]
+    for start in range(0, len(x), block_size):
+      block = out[start:start + block_size]
+      if out is not x:
+        block[...] = x[start:start + block_size]
+      for function in functions:
+        function(block)
+    return _like(out, values)
+
+  def get_config(self):
+    """Returns the JSON-serializable description of this pipeline."""
+    return {"kind": self.kind, "steps": [list(step) for step in self.steps],
+            "statistics": self.statistics, "dtype": self.dtype.name}
+
+
+_SCALER_CLASSES[Pipeline.kind] = Pipeline
@@ -0,0 +1,77 @@
+"""Tests that saved scalers and pipelines load back to the same transforms."""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import transforms
+
+
+class SaveScalersTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, "scalers.json")
+    random_state = np.random.RandomState(0)
+    self.training = random_state.lognormal(8.0, 1.0, 1000)
+    self.validation = random_state.lognormal(8.0, 1.5, 500)
+
+  def tearDown(self):
+    shutil.rmtree(self.directory, ignore_errors=True)
+
+  def roundTrip(self, scalers):
+    for scaler in scalers.values():
+      scaler.fit(self.training)
+    transforms.save_scalers(scalers, self.path)
+    with open(self.path) as f:
+      # The file must be strict JSON, without Infinity or NaN.
+      json.load(f, parse_constant=self.fail)
+    return transforms.load_scalers(self.path)
+
+  def assertSameTransform(self, scalers, loaded):
+    self.assertEqual(sorted(loaded), sorted(scalers))
+    for name, scaler in scalers.items():
+      self.assertIs(type(loaded[name]), type(scaler))
+      np.testing.assert_array_equal(loaded[name].transform(self.validation),
+                                    scaler.transform(self.validation))
+
+  def testScalers(self):
+    scalers = {
+        "linear": transforms.LinearScaler(),
+        "log_linear": transforms.LogLinearScaler(),
+        "clipped": transforms.ClippedLinearScaler(0, 5000),
+        "clipped_above": transforms.ClippedLinearScaler(clip_to_max=5000),
+        "clipped_below": transforms.ClippedLinearScaler(clip_to_min=100),
+    }
+    loaded = self.roundTrip(scalers)
+    self.assertEqual(loaded["clipped_above"].clip_to_min, -np.inf)
+    self.assertEqual(loaded["clipped_below"].clip_to_max, np.inf)
+    self.assertSameTransform(scalers, loaded)
+
+  def testPipelines(self):
+    scalers = {
+        "bounded": transforms.Pipeline([("clip", 0, 5000), "log1p",
+                                        "minmax"]),
+        "unbounded": transforms.Pipeline([("clip", 100, np.inf), "log1p",
+                                          "zscore"]),
+        "stateless": transforms.Pipeline([("clip", -np.inf, 5000),
+                                          "log1p"]),
+    }
+    loaded = self.roundTrip(scalers)
+    self.assertEqual(loaded["unbounded"].steps[0], ("clip", 100, np.inf))
+    self.assertEqual(loaded["stateless"].steps[0], ("clip", -np.inf, 5000))
+    self.assertSameTransform(scalers, loaded)
+
+  def testUnfitScalerFails(self):
+    with self.assertRaises(ValueError):
+      transforms.LinearScaler().transform(self.validation)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,266 @@
+"""Offline dictionary encoding of the categorical features.
+
+Labs 8-11 define the census categorical features with
+`sparse_column_with_hash_bucket` and `sparse_column_with_keys`, so every
+training and serving step hashes or looks up the raw strings of
+`workclass`, `education`, `occupation`, `native_country`, `gender`, ...
+again inside the graph.  A `Vocabulary` maps each column to dense int32 ids
+once, before training, and is saved next to the model so serving uses the
+same ids.  The feature columns then read the ids directly:
+
+  vocabs = vocabularies.fit_vocabularies(training_examples,
+                                         CATEGORICAL_COLUMNS)
+  vocabularies.save_vocabularies(vocabs, "/tmp/census_vocabularies.json")
+  training_examples = vocabularies.encode_categorical(training_examples,
+                                                      vocabs)
+  validation_examples = vocabularies.encode_categorical(validation_examples,
+                                                        vocabs)
+  columns = vocabularies.integerized_columns(vocabs)
+  workclass = columns["workclass"]
+
+The ids also take 4 bytes per row instead of a Python string object.
+
+A `TermVocabulary` does the same for the variable-length `terms` of the lab
+12 reviews, whose TFRecords `tfrecords.tokenize_terms` rewrites with ids.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+import json
+import zlib
+
+import numpy as np
+import pandas as pd
+
+
+def _as_text(values):
+  """Returns the distinct values of `values` as strings, and their codes.
+
+  Missing values get the code -1.  Only the distinct values are converted,
+  so an integer column and its string form map to the same ids.
+  """
+  codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+  return codes, [u"%s" % v for v in uniques]
+
+
+class Vocabulary(object):
+  """Maps the values of a categorical column to dense int32 ids.
+
+  The values are compared as strings, so ids fitted on `[3, 1, 3]` or on
+  `["3", "1", "3"]` are the same.  Known values get the ids 0 to
+  `len(values) - 1`, most frequent first.  Missing values and values not in
+  the vocabulary all get the out-of-vocabulary id `len(values)`, so the ids
+  always lie in `[0, size)`.
+  """
+
+  def __init__(self, values=None):
+    self.values = list(values) if values is not None else []
+
+  @property
+  def oov_id(self):
+    return len(self.values)
+
+  @property
+  def size(self):
+    """The number of distinct ids, including the out-of-vocabulary id."""
+    return len(self.values) + 1
+
+  def fit(self, values, max_size=None, min_count=1):
+    """Builds the vocabulary from the values of a column.
+
+    Args:
+      values: A Series or array of strings or integers, possibly with NaNs.
+      max_size: The maximum number of values to keep, or None to keep all.
+        The least frequent values are dropped first.
+      min_count: The minimum number of occurrences of a kept value.
+    Returns:
+      This vocabulary.
+    """
+    codes, text = _as_text(values)
+    counts = np.bincount(codes[codes >= 0], minlength=len(text))
+    counts = pd.Series(counts, index=text).groupby(level=0).sum()
+    counts = counts[counts >= min_count]
+    # Break ties by value so the ids do not depend on the row order.
+    order = np.lexsort((np.asarray(counts.index, dtype=object).astype(str),
+                        -counts.values))
+    self.values = list(counts.index[order])
+    if max_size is not None:
+      self.values = self.values[:max_size]
+    return self
+
+  def transform(self, values):
+    """Returns the int32 id of every value."""
+    codes, text = _as_text(values)
+    lookup = np.asarray(pd.Index(self.values).get_indexer(text),
+                        dtype=np.int32)
+    lookup[lookup < 0] = self.oov_id
+    ids = np.full(len(codes), self.oov_id, dtype=np.int32)
+    ids[codes >= 0] = lookup[codes[codes >= 0]]
+    return ids
+
+  def get_config(self):
+    return {"values": self.values}
+
+
+def fit_vocabularies(dataframe, columns, max_size=None, min_count=1):
+  """Builds a `Vocabulary` for each of `columns`.
+
+  Args:
+    dataframe: The DataFrame to build the vocabularies from, normally the
+      training examples only.
+    columns: The names of the categorical columns.
+    max_size: The maximum number of values per vocabulary.
+    min_count: The minimum number of occurrences of a kept value.
+  Returns:
+    An ordered dictionary mapping each column name to its `Vocabulary`.
+  """
+  return collections.OrderedDict(
+      (name, Vocabulary().fit(dataframe[name], max_size, min_count))
+      for name in columns)
+
+
+def encode_categorical(dataframe, vocabularies):
+  """Returns a copy of `dataframe` with the categorical columns as int32 ids.
+
+  Args:
+    dataframe: The Pandas DataFrame to encode.
+    vocabularies: A dictionary mapping column names to `Vocabulary` objects.
+  Returns:
+    A new DataFrame.  The other columns are shared with `dataframe`.
+  """
+  encoded = dataframe.copy(deep=False)
+  for name, vocabulary in vocabularies.items():
+    encoded[name] = vocabulary.transform(dataframe[name])
+  return encoded
+
+
+def save_vocabularies(vocabularies, path):
+  """Writes vocabularies to a JSON file."""
+  with open(path, "w") as f:
+    json.dump(collections.OrderedDict(
+        (name, vocabulary.get_config())
+        for name, vocabulary in vocabularies.items()), f, indent=2)
+
+
+def load_vocabularies(path):
+  """Reads the vocabularies written by `save_vocabularies`."""
+  with open(path) as f:
+    configs = json.load(f, object_pairs_hook=collections.OrderedDict)
+  return collections.OrderedDict(
+      (name, Vocabulary(config["values"])) for name, config in configs.items())
+
+
+def integerized_columns(vocabularies):
+  """Returns sparse feature columns that consume the encoded ids.
+
+  Args:
+    vocabularies: A dictionary mapping column names to `Vocabulary` objects.
+  Returns:
+    A dictionary mapping each column name to a
+    `sparse_column_with_integerized_feature` with one bucket per id, to use
+    in place of `sparse_column_with_keys` or `sparse_column_with_hash_bucket`
+    (including inside crossed and embedding columns).
+  """
+  # Imported here so encoding the data offline does not need TensorFlow.
+  import tensorflow as tf
+  return dict(
+      (name, tf.contrib.layers.sparse_column_with_integerized_feature(
+          name, bucket_size=vocabulary.size, dtype=tf.int32))
+      for name, vocabulary in vocabularies.items())
+
+
+OOV_POLICIES = ("drop", "bucket")
+
+
+class TermVocabulary(object):
+  """Maps the terms of a text feature to int64 ids.
+
+  Known terms get the ids 0 to `len(terms) - 1` in the order given.  What
+  happens to other terms is the out-of-vocabulary policy:
+
+  * "drop": they are left out, as `sparse_column_with_keys` does with the
+    lab 12 `informative_terms`.
+  * "bucket": they are hashed into `num_oov_buckets` extra ids after the
+    known ones.  The hash is CRC32 of the UTF-8 bytes, so it is stable
+    across runs and machines.
+  """
+
+  def __init__(self, terms, oov_policy="drop", num_oov_buckets=0):
+    if oov_policy not in OOV_POLICIES:
+      raise ValueError("oov_policy must be one of %s, got %r" %
+                       (OOV_POLICIES, oov_policy))
+    if oov_policy == "bucket" and num_oov_buckets < 1:
+      raise ValueError("The bucket policy needs num_oov_buckets >= 1")
+    if oov_policy == "drop":
+      num_oov_buckets = 0
+    # Duplicates keep their first id.
+    self.terms = list(collections.OrderedDict.fromkeys(
+        _to_text(term) for term in terms))
+    self.oov_policy = oov_policy
+    self.num_oov_buckets = num_oov_buckets
+    self._ids = dict((term, i) for i, term in enumerate(self.terms))
+
+  @classmethod
+  def from_file(cls, path, oov_policy="drop", num_oov_buckets=0):
+    """Reads a whitespace-separated vocabulary file such as terms.txt."""
+    with open(path, "rb") as f:
+      terms = f.read().decode("utf-8").split()
+    return cls(terms, oov_policy, num_oov_buckets)
+
+  @property
+  def size(self):
+    """The number of distinct ids, including the out-of-vocabulary ones."""
+    return len(self.terms) + self.num_oov_buckets
+
+  def ids(self, terms):
+    """Returns the list of ids of `terms`, applying the OOV policy."""
+    result = []
+    for term in terms:
+      term = _to_text(term)
+      term_id = self._ids.get(term)
+      if term_id is None:
+        if self.oov_policy == "drop":
+          continue
+        term_id = len(self.terms) + (
+            zlib.crc32(term.encode("utf-8")) & 0xffffffff
+        ) % self.num_oov_buckets
+      result.append(term_id)
+    return result
+
+  def get_config(self):
+    return {"terms": self.terms, "oov_policy": self.oov_policy,
+            "num_oov_buckets": self.num_oov_buckets}
+
+  def save(self, path):
+    """Writes the vocabulary and its OOV policy to a JSON file."""
+    with open(path, "w") as f:
+      json.dump(self.get_config(), f)
+
+  @classmethod
+  def load(cls, path):
+    """Reads a vocabulary written by `save`."""
+    with open(path) as f:
+      return cls(**json.load(f))
+
+
+def _to_text(term):
+  if isinstance(term, bytes):
+    return term.decode("utf-8")
+  return u"%s" % term
+
+
+def term_id_column(vocabulary, column_name="terms"):
+  """Returns a sparse feature column that consumes term ids.
+
+  Args:
+    vocabulary: The `TermVocabulary` the ids were produced with.
+    column_name: The name of the feature.
+  Returns:
+    A `sparse_column_with_integerized_feature` with one bucket per id, to
+    use in place of `sparse_column_with_keys`, e.g. inside an
+    `embedding_column`.
+  """
+  import tensorflow as tf
+  return tf.contrib.layers.sparse_column_with_integerized_feature(
+      column_name, bucket_size=vocabulary.size, dtype=tf.int64)
@@ -0,0 +1,142 @@
+"""Tests for the offline dictionary encoding of categorical features."""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+
+import numpy as np
+import pandas as pd
+
+import vocabularies
+
+
+class VocabularyTest(unittest.TestCase):
+
+  def testIntegersAndStringsGetTheSameIds(self):
+    vocabulary = vocabularies.Vocabulary().fit([3, 1, 3])
+    self.assertEqual(vocabulary.values, ["3", "1"])
+    np.testing.assert_array_equal(vocabulary.transform([3, 1, 3]), [0, 1, 0])
+    np.testing.assert_array_equal(vocabulary.transform(["3", "1"]), [0, 1])
+    from_strings = vocabularies.Vocabulary().fit(["3", "1", "3"])
+    self.assertEqual(from_strings.values, vocabulary.values)
+
+  def testMissingAndUnknownValuesGetTheOovId(self):
+    vocabulary = vocabularies.Vocabulary().fit(
+        pd.Series(["Private", None, "State-gov", "Private", np.nan]))
+    self.assertEqual(vocabulary.values, ["Private", "State-gov"])
+    self.assertEqual(vocabulary.oov_id, 2)
+    self.assertEqual(vocabulary.size, 3)
+    ids = vocabulary.transform(
+        pd.Series(["State-gov", None, "Never-worked", np.nan, "Private"]))
+    self.assertEqual(ids.dtype, np.int32)
+    np.testing.assert_array_equal(ids, [1, 2, 2, 2, 0])
+
+  def testCategoricalColumns(self):
+    values = pd.Series(["b", "a", "b", None]).astype("category")
+    vocabulary = vocabularies.Vocabulary().fit(values)
+    self.assertEqual(vocabulary.values, ["b", "a"])
+    np.testing.assert_array_equal(vocabulary.transform(values), [0, 1, 0, 2])
+
+  def testMaxSizeAndMinCount(self):
+    values = ["a"] * 5 + ["b"] * 4 + ["c"] * 2 + ["d"]
+    self.assertEqual(
+        vocabularies.Vocabulary().fit(values, max_size=2).values, ["a", "b"])
+    self.assertEqual(
+        vocabularies.Vocabulary().fit(values, min_count=2).values,
+        ["a", "b", "c"])
+    vocabulary = vocabularies.Vocabulary().fit(values, max_size=2,
+                                               min_count=5)
+    self.assertEqual(vocabulary.values, ["a"])
+    np.testing.assert_array_equal(vocabulary.transform(["b", "a"]), [1, 0])
+
+  def testTiesAreOrderedByValue(self):
+    values = ["z", "y", "x", "y", "z", "x", "w"]
+    vocabulary = vocabularies.Vocabulary().fit(values)
+    self.assertEqual(vocabulary.values, ["x", "y", "z", "w"])
+    self.assertEqual(vocabularies.Vocabulary().fit(values[::-1]).values,
+                     vocabulary.values)
+
+  def testEncodeCategorical(self):
+    dataframe = pd.DataFrame({"gender": ["Male", "Female", "Male"],
+                              "age": [39, 50, 38]})
+    vocabs = vocabularies.fit_vocabularies(dataframe, ["gender"])
+    encoded = vocabularies.encode_categorical(dataframe, vocabs)
+    np.testing.assert_array_equal(encoded["gender"].values, [0, 1, 0])
+    np.testing.assert_array_equal(encoded["age"].values, [39, 50, 38])
+    self.assertEqual(list(dataframe["gender"]), ["Male", "Female", "Male"])
+
+
+class SaveVocabulariesTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory, ignore_errors=True)
+
+  def testRoundTrip(self):
+    dataframe = pd.DataFrame({
+        "workclass": ["Private", "State-gov", None, "Private"],
+        "education": [u"Bachelors", u"Pr\xe9school", u"Bachelors", u"HS"],
+        "code": [7, 3, 7, 7]})
+    vocabs = vocabularies.fit_vocabularies(
+        dataframe, ["workclass", "education", "code"])
+    path = os.path.join(self.directory, "vocabularies.json")
+    vocabularies.save_vocabularies(vocabs, path)
+    loaded = vocabularies.load_vocabularies(path)
+    self.assertEqual(list(loaded), list(vocabs))
+    for name, vocabulary in vocabs.items():
+      self.assertEqual(loaded[name].values, vocabulary.values)
+      np.testing.assert_array_equal(loaded[name].transform(dataframe[name]),
+                                    vocabulary.transform(dataframe[name]))
+
+
+class TermVocabularyTest(unittest.TestCase):
+
+  def testDropPolicyLeavesOutUnknownTerms(self):
+    vocabulary = vocabularies.TermVocabulary(["great", "bad", "great", "ok"])
+    self.assertEqual(vocabulary.terms, ["great", "bad", "ok"])
+    self.assertEqual(vocabulary.size, 3)
+    self.assertEqual(vocabulary.ids([b"bad", u"awful", "great", "ok"]),
+                     [1, 0, 2])
+    self.assertEqual(vocabulary.ids(["awful"]), [])
+
+  def testBucketPolicyHashesUnknownTerms(self):
+    vocabulary = vocabularies.TermVocabulary(
+        ["great", "bad"], oov_policy="bucket", num_oov_buckets=5)
+    self.assertEqual(vocabulary.size, 7)
+    ids = vocabulary.ids(["bad", "awful", b"awful", "meh"])
+    self.assertEqual(ids[0], 1)
+    self.assertEqual(ids[1], ids[2])
+    self.assertEqual(ids[1], 2 + (zlib.crc32(b"awful") & 0xffffffff) % 5)
+    for term_id in ids[1:]:
+      self.assertGreaterEqual(term_id, 2)
+      self.assertLess(term_id, vocabulary.size)
+
+  def testInvalidPolicies(self):
+    with self.assertRaises(ValueError):
+      vocabularies.TermVocabulary(["a"], oov_policy="ignore")
+    with self.assertRaises(ValueError):
+      vocabularies.TermVocabulary(["a"], oov_policy="bucket")
+
+  def testSaveAndLoad(self):
+    directory = tempfile.mkdtemp()
+    try:
+      path = os.path.join(directory, "terms.json")
+      vocabulary = vocabularies.TermVocabulary(
+          ["great", "bad"], oov_policy="bucket", num_oov_buckets=3)
+      vocabulary.save(path)
+      loaded = vocabularies.TermVocabulary.load(path)
+      self.assertEqual(loaded.get_config(), vocabulary.get_config())
+      self.assertEqual(loaded.ids(["bad", "awful"]),
+                       vocabulary.ids(["bad", "awful"]))
+    finally:
+      shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+  unittest.main()